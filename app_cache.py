@@ -0,0 +1,16 @@
+import os
+import sys
+
+
+def user_cache_dir(app_name):
+    """
+    返回本机用户缓存目录下 app_name 对应的子目录，不存在时自动创建。
+    Windows 为 %LOCALAPPDATA%\\app_name，其他系统为 ~/.cache/app_name。
+    """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, app_name)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -1,8 +1,37 @@
 import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import mmap
+import queue
+import threading
+import multiprocessing
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
 import logging
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
 from datetime import datetime
+from itertools import compress, repeat
+import numpy as np
+from fast_walk import walk
+from app_cache import user_cache_dir
+
+PARSE_CHUNK_LINES = 500000  # 快速解析和写出时每批处理的行数，限制临时列表占用的内存
+DEFAULT_WORKERS = os.cpu_count() or 4  # 默认进程数，各文件相互独立，可以占满所有核
+LARGE_FILE_SIZE = 512 * 1024 * 1024  # 超过该大小的文件拆成多段，由多个进程并行解析
+LARGE_FILE_CHUNK_SIZE = 16 * 1024 * 1024  # 大文件每段的字节数（按行边界对齐）
+LINE_END = re.compile(rb"\r\n?|\n")  # 与文本模式的通用换行规则一致
+MANIFEST_NAME = "calculated_value_manifest.json"  # 增量处理清单，保存在所选文件夹下
+# 换算参数，变化后清单中的旧记录全部失效
+PROCESS_PARAMS = {"version": 1, "columns": [4, 3], "scale": "2 / 0.085", "round": 6}
+COLUMN_CACHE_NAME = "calculated_value"  # 解析结果缓存所在的缓存子目录
+COLUMN_CACHE_VERSION = 1  # 解析规则变化时递增，旧缓存自动失效
+MANIFEST_SAVE_INTERVAL = 5.0  # 处理过程中保存清单的时间间隔（秒），取消或中断时已完成的文件不必重做
 
 
 def check_trial_period():
@@ -28,66 +57,523 @@ def setup_logging():
     return log_file
 
 
-def process_file(file_path):
+def process_file(file_path, log=logging.log):
+    """逐行解析文件，返回字段数为 12 的行；log(级别, 消息) 用于在子进程中收集日志"""
     all_data = []
     try:
-        logging.info(f"开始处理文件: {file_path}")
+        log(logging.INFO, f"开始处理文件: {file_path}")
         with open(file_path, 'r', encoding='iso-8859-1') as file:
             for line in file:
                 clean_line = line.strip()
                 data_array = clean_line.split(',')
                 if len(data_array) == 12:
                     all_data.append(data_array)
-        logging.info(f"文件 {file_path} 成功读取，包含 {len(all_data)} 行有效数据")
+        log(logging.INFO, f"文件 {file_path} 成功读取，包含 {len(all_data)} 行有效数据")
     except Exception as e:
-        logging.error(f"处理文件 {file_path} 时发生错误: {e}")
+        log(logging.ERROR, f"处理文件 {file_path} 时发生错误: {e}")
     return all_data
 
 
-def process_folder(folder_path):
+def split_valid_lines(data):
+    """
+    按 process_file 的规则拆分 bytes：\\r\\n、\\r 都视为换行，恰好有 11 个逗号（12 个字段）的行才是有效数据。
+    行的拆分和逗号计数都在 C 层完成（bytes.split / bytes.count），返回有效行列表。
+    """
+    lines = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n").split(b"\n")
+    comma_counts = np.fromiter(map(bytes.count, lines, repeat(b",")), dtype=np.int64, count=len(lines))
+    return list(compress(lines, (comma_counts == 11).tolist()))
+
+
+def parse_lines(valid, col4, col3):
+    """
+    把有效行的第 4、5 列（下标 3、4）解析到 col3、col4（长度与 valid 相同的 float64 数组）。
+    字段无法按 bytes 解析为 float（例如含有非 ASCII 空白）时返回 False。
+    """
+    for start in range(0, len(valid), PARSE_CHUNK_LINES):
+        chunk = valid[start:start + PARSE_CHUNK_LINES]
+        # 每行恰好 12 个字段，拼接后整体切分，第 i 行的第 k 个字段位于 12 * i + k
+        fields = b",".join(chunk).split(b",")
+        try:
+            col3[start:start + len(chunk)] = np.fromiter(map(float, fields[3::12]), dtype=np.float64, count=len(chunk))
+            col4[start:start + len(chunk)] = np.fromiter(map(float, fields[4::12]), dtype=np.float64, count=len(chunk))
+        except ValueError:
+            return False
+    return True
+
+
+def read_columns(file_path, hasher=None):
+    """
+    快速解析路径：一次读入整个文件，只把第 4、5 列解析为 float64 数组，返回 (第 5 列, 第 4 列)，不为每行保留 12 个字符串。
+    读取失败或字段无法按 bytes 解析时返回 None，由调用方回退到 process_file 逐行解析，保证两条路径的结果完全相同。
+    传入 hasher 时用已读入的内容更新它，写解析缓存时不必再读一遍文件。
+    """
+    try:
+        with open(file_path, 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+    if hasher is not None:
+        hasher.update(data)
+    valid = split_valid_lines(data)
+    del data
+    col3 = np.empty(len(valid), dtype=np.float64)
+    col4 = np.empty(len(valid), dtype=np.float64)
+    if not parse_lines(valid, col4, col3):
+        return None
+    return col4, col3
+
+
+def split_ranges(file_path, chunk_size=None):
+    """用 mmap 把文件切成约 chunk_size 字节（默认 LARGE_FILE_CHUNK_SIZE）的 [(起始, 结束), ...]，每段都在换行符之后结束，不会切断一行"""
+    chunk_size = chunk_size or LARGE_FILE_CHUNK_SIZE
+    ranges = []
+    with open(file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            start = 0
+            while start < size:
+                match = LINE_END.search(mm, start + chunk_size) if start + chunk_size < size else None
+                end = match.end() if match else size
+                ranges.append((start, end))
+                start = end
+    return ranges
+
+
+def read_range(file_path, start, end):
+    with open(file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[start:end]
+
+
+def count_chunk(file_path, start, end):
+    """子进程：统计一段中的有效行数，用于主进程分配共享内存"""
+    return len(split_valid_lines(read_range(file_path, start, end)))
+
+
+def parse_chunk(file_path, start, end, names, offset, count):
+    """
+    子进程：解析一段，把第 4、5 列写入主进程共享内存中 [offset, offset + count) 的位置，返回这一段第 4 列的最大值。
+    有效行数与统计时不一致（文件被修改）或字段无法解析时返回 None。
+    """
+    valid = split_valid_lines(read_range(file_path, start, end))
+    if len(valid) != count:
+        return None
+    # 共享内存由主进程创建和释放，子进程只打开和关闭
+    blocks = [SharedMemory(name=name) for name in names]
+    col3 = col4 = None
+    try:
+        col3 = np.ndarray((count,), dtype=np.float64, buffer=blocks[0].buf, offset=offset * 8)
+        col4 = np.ndarray((count,), dtype=np.float64, buffer=blocks[1].buf, offset=offset * 8)
+        if not parse_lines(valid, col4, col3):
+            return None
+        return float(col3.max())
+    finally:
+        # 关闭共享内存前必须释放其上的数组视图
+        col3 = col4 = None
+        for block in blocks:
+            block.close()
+
+
+def column_cache_root():
+    return os.path.join(user_cache_dir(COLUMN_CACHE_NAME), "columns")
+
+
+def column_cache_dir(file_path):
+    """每个输入文件一个缓存目录（以规范化绝对路径的 MD5 命名），内含 meta.json、col3.npy、col4.npy"""
+    key = hashlib.md5(os.path.normcase(os.path.abspath(file_path)).encode("utf-8", "surrogatepass")).hexdigest()
+    return os.path.join(column_cache_root(), key)
+
+
+def file_digest(file_path):
+    hasher = new_digest()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def new_digest():
+    """解析缓存使用的内容哈希，read_columns 和 file_digest 必须使用同一种算法"""
+    return hashlib.blake2b()
+
+
+def write_json_atomic(path, data):
+    temp_file = path + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_file, path)
+
+
+def load_cached_columns(file_path):
+    """
+    读取缓存的解析结果，返回以只读内存映射方式打开的 (第 5 列, 第 4 列)，没有可用缓存时返回 None。
+    大小和修改时间都与缓存一致时直接使用；只有修改时间变化（例如文件被复制或 touch）时比较内容哈希，
+    缓存未记录内容哈希（大文件分段解析、逐行解析）时视为失效。
+    """
+    entry_dir = column_cache_dir(file_path)
+    try:
+        with open(os.path.join(entry_dir, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        st = os.stat(file_path)
+        if meta["version"] != COLUMN_CACHE_VERSION or meta["size"] != st.st_size:
+            return None
+        if meta["mtime_ns"] != st.st_mtime_ns:
+            if meta["digest"] is None or file_digest(file_path) != meta["digest"]:
+                return None
+            meta["mtime_ns"] = st.st_mtime_ns
+            write_json_atomic(os.path.join(entry_dir, "meta.json"), meta)
+        col3 = np.load(os.path.join(entry_dir, "col3.npy"), mmap_mode="r")
+        col4 = np.load(os.path.join(entry_dir, "col4.npy"), mmap_mode="r")
+    except (OSError, ValueError, KeyError):
+        return None
+    if len(col3) != meta["rows"] or len(col4) != meta["rows"]:
+        return None
+    return col4, col3
+
+
+def store_cached_columns(file_path, st, col4, col3, digest, log):
+    """
+    保存解析结果。先删除旧的 meta.json 使旧缓存失效，数组写完后最后写入 meta.json，中途失败不会留下不一致的缓存。
+    st 为解析前的 stat 结果，解析期间文件被修改时下次会因修改时间不同而重新校验内容。
+    digest 为解析时读到的内容哈希，没有时为 None（不再为此重新读取文件）。
+    写缓存失败（磁盘满、缓存目录不可写、Windows 上旧缓存仍被内存映射等）只记录警告，不影响本次处理结果。
+    """
+    entry_dir = column_cache_dir(file_path)
+    try:
+        os.makedirs(entry_dir, exist_ok=True)
+        meta_file = os.path.join(entry_dir, "meta.json")
+        if os.path.exists(meta_file):
+            os.remove(meta_file)
+        for name, column in (("col3", col3), ("col4", col4)):
+            temp_file = os.path.join(entry_dir, name + ".tmp")
+            with open(temp_file, 'wb') as f:
+                np.save(f, column)
+            os.replace(temp_file, os.path.join(entry_dir, name + ".npy"))
+        write_json_atomic(meta_file, {"version": COLUMN_CACHE_VERSION, "path": os.path.abspath(file_path),
+                                      "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                                      "digest": digest, "rows": len(col3)})
+    except OSError as e:
+        log(logging.WARNING, f"写入解析缓存失败: {file_path}，错误: {e}")
+
+
+def clear_column_cache():
+    """删除全部解析缓存，返回释放的字节数"""
+    cache_root = column_cache_root()
+    freed = 0
+    for dirpath, _, filenames in os.walk(cache_root):
+        for filename in filenames:
+            try:
+                freed += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    shutil.rmtree(cache_root, ignore_errors=True)
+    return freed
+
+
+def column_max(col3, max_value=None):
+    """
+    A 列最大值，结果与内置 max() 完全相同。max_value 为已按 numpy 规则算好的最大值（例如各段最大值的最大值）。
+    含 NaN 时 max() 的结果取决于元素顺序，0.0 与 -0.0 相等时 max() 保留先出现的一个，这两种情况交给内置 max()。
+    """
+    if max_value is None:
+        max_value = float(col3.max())
+    if max_value == 0 or max_value != max_value:
+        max_value = max(col3.tolist())
+    return max_value
+
+
+def write_columns(output_file, col4, col3, max_value):
+    """
+    向量化计算 (最大值 - A 列) * 2 / 0.085，并分批写出 "第 5 列\\t结果" 行。
+    运算顺序与逐行计算相同；舍入使用内置 round 保证与原来的 6 位小数结果一致。
+    """
+    with open(output_file, 'w', encoding='utf-8') as out_file:
+        for start in range(0, len(col3), PARSE_CHUNK_LINES):
+            end = start + PARSE_CHUNK_LINES
+            with np.errstate(invalid="ignore"):  # inf - inf 得到 nan，与逐行计算一致
+                values = (max_value - col3[start:end]) * 2 / 0.085
+            rounded = map(round, values.tolist(), repeat(6))
+            out_file.write("\n".join(map("{}\t{}".format, col4[start:end].tolist(), rounded)))
+            out_file.write("\n")
+
+
+def new_result(file_path):
+    """创建单个文件的结果和日志收集函数。日志不直接写入，随结果返回，由主进程按文件顺序写入日志"""
+    logs = []
+    result = {"file_path": file_path, "rows": 0, "max_value": None, "output_file": None, "error": None,
+              "logs": logs}
+
+    def log(level, message):
+        logs.append((level, message))
+
+    log(logging.INFO, f"正在处理文件: {file_path}")
+    return result, log
+
+
+def last_folder_name(root):
+    """输出文件名为 correct.<最后一层目录名><输入文件名>"""
+    # 统一路径分隔符为 `/`
+    normalized_path = root.replace("\\", "/")
+    # 获取最后一层目录名
+    return os.path.basename(normalized_path)
+
+
+def save_output(result, log, file_path, root, file, col4, col3, max_value):
+    """按最大值换算并保存结果文件"""
+    result["max_value"] = max_value
+    log(logging.INFO, f"文件 {file_path} 的 A 列最大值为: {max_value}")
+
+    # 输出文件路径
+    log(logging.INFO, f"root: {root}")
+    last_folder = last_folder_name(root)
+    log(logging.INFO, f"last_folder: {last_folder}")
+    output_file = os.path.join(root, f"correct.{last_folder}{file}")
+
+    # 保存处理结果
+    write_columns(output_file, col4, col3, max_value)
+    result["output_file"] = output_file
+    log(logging.INFO, f"文件 {file_path} 已成功保存为 {output_file}")
+
+
+def process_one_file(file_path, root, file, cache=None):
+    """
+    处理单个文件（在子进程中执行）。cache 为 None（不使用解析缓存）、"use"（优先读取缓存）或 "rebuild"（重新解析并覆盖缓存）。
+    返回 {"file_path", "rows", "max_value", "output_file", "error", "logs"}，跳过的文件 output_file 为 None。
+    """
+    result, log = new_result(file_path)
+    try:
+        columns = load_cached_columns(file_path) if cache == "use" else None
+        if columns is not None:
+            col4, col3 = columns
+            log(logging.INFO, f"文件 {file_path} 从解析缓存读取，包含 {len(col3)} 行有效数据")
+        else:
+            st = os.stat(file_path)
+            # 读取并处理文件，优先使用快速解析路径
+            hasher = new_digest() if cache is not None else None
+            columns = read_columns(file_path, hasher)
+            if columns is not None:
+                col4, col3 = columns
+                digest = hasher and hasher.hexdigest()
+                log(logging.INFO, f"文件 {file_path} 成功读取，包含 {len(col3)} 行有效数据")
+            else:
+                rows = process_file(file_path, log)
+                col4 = np.array([float(data_array[4]) for data_array in rows], dtype=np.float64)
+                col3 = np.array([float(data_array[3]) for data_array in rows], dtype=np.float64)
+                digest = None
+            if cache is not None:
+                store_cached_columns(file_path, st, col4, col3, digest, log)
+        result["rows"] = len(col3)
+
+        # 如果没有有效数据，跳过该文件
+        if not len(col3):
+            log(logging.WARNING, f"文件 {file_path} 数据为空，跳过处理。")
+            return result
+
+        # 找到 A 列的最大值
+        save_output(result, log, file_path, root, file, col4, col3, column_max(col3))
+    except Exception as e:
+        result["error"] = str(e)
+        log(logging.ERROR, f"处理文件 {file_path} 时发生错误: {e}")
+    return result
+
+
+def process_large_file(file_path, root, file, cache=None, executor=None):
+    """
+    在主进程中调度大文件的分段并行解析：先并行统计每段的有效行数，据此分配两块共享内存（第 4、5 列），
+    再由子进程把各段解析结果直接写入共享内存的对应位置并返回段内最大值，最后用全局最大值换算并写出。
+    内存占用约为两列 float64 数据的大小。任何一段无法快速解析时整个文件回退到 process_one_file。
+    有可用的解析缓存时直接读取缓存，不再分段解析。
+    """
+    if cache == "use" and load_cached_columns(file_path) is not None:
+        return process_one_file(file_path, root, file, cache)
+
+    result, log = new_result(file_path)
+    blocks = []
+    col3 = col4 = None
+    fallback = False
+    try:
+        st = os.stat(file_path)
+        ranges = split_ranges(file_path)
+        starts, ends = zip(*ranges)
+        counts = list(executor.map(count_chunk, repeat(file_path), starts, ends))
+        total = sum(counts)
+        log(logging.INFO, f"文件 {file_path} 成功读取，包含 {total} 行有效数据（分 {len(ranges)} 段并行解析）")
+        result["rows"] = total
+
+        # 如果没有有效数据，跳过该文件
+        if not total:
+            log(logging.WARNING, f"文件 {file_path} 数据为空，跳过处理。")
+            return result
+
+        blocks = [SharedMemory(create=True, size=total * 8) for _ in range(2)]
+        names = [block.name for block in blocks]
+        futures = []
+        offset = 0
+        for (start, end), count in zip(ranges, counts):
+            if count:
+                futures.append(executor.submit(parse_chunk, file_path, start, end, names, offset, count))
+            offset += count
+        chunk_maxes = [future.result() for future in futures]
+        if any(chunk_max is None for chunk_max in chunk_maxes):
+            fallback = True
+        else:
+            col3 = np.ndarray((total,), dtype=np.float64, buffer=blocks[0].buf)
+            col4 = np.ndarray((total,), dtype=np.float64, buffer=blocks[1].buf)
+            if cache is not None:
+                # 各段由子进程分别读取，没有整个文件的内容哈希
+                store_cached_columns(file_path, st, col4, col3, None, log)
+            # np.max 在有 NaN 时返回 NaN，与对整列求 np.max 的结果相同
+            max_value = column_max(col3, float(np.max(chunk_maxes)))
+            save_output(result, log, file_path, root, file, col4, col3, max_value)
+    except Exception as e:
+        result["error"] = str(e)
+        log(logging.ERROR, f"处理文件 {file_path} 时发生错误: {e}")
+    finally:
+        # 关闭共享内存前必须释放其上的数组视图
+        col3 = col4 = None
+        for block in blocks:
+            block.close()
+            block.unlink()
+    if fallback:
+        log(logging.INFO, f"文件 {file_path} 无法分段快速解析，改为整体解析")
+        fallback_result = process_one_file(file_path, root, file, cache)
+        fallback_result["logs"][:1] = result["logs"]
+        return fallback_result
+    return result
+
+
+def iter_results(tasks, workers, should_stop):
+    """
+    按任务顺序产出 process_one_file 的结果。workers 为 1 时在当前进程中依次处理，否则使用进程池并行处理，
+    只保留有限数量的已提交任务。should_stop() 返回 True 后不再提交新任务并取消未开始的任务，已开始的文件会处理完。
+    超过 LARGE_FILE_SIZE 的文件轮到它时由主进程调用 process_large_file，分段交给同一个进程池并行解析。
+    """
+    if workers == 1:
+        for task in tasks:
+            if should_stop():
+                return
+            yield process_one_file(*task)
+        return
+
+    def is_large(file_path):
+        try:
+            return os.path.getsize(file_path) >= LARGE_FILE_SIZE
+        except OSError:
+            return False
+
+    def resolve(item):
+        return item.result() if isinstance(item, Future) else process_large_file(*item, executor=executor)
+
+    if os.name != "nt":
+        # 先在主进程启动 resource_tracker，子进程才会共用它，否则各子进程会把打开过的共享内存当作泄漏清理
+        resource_tracker.ensure_running()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            for task in tasks:
+                if should_stop():
+                    return
+                pending.append(task if is_large(task[0]) else executor.submit(process_one_file, *task))
+                if len(pending) >= workers * 2:
+                    yield resolve(pending.popleft())
+            while pending:
+                if should_stop():
+                    return
+                yield resolve(pending.popleft())
+        finally:
+            for item in pending:
+                if isinstance(item, Future):
+                    item.cancel()
+
+
+def load_manifest(folder_path):
+    """读取增量处理清单 {输入文件相对路径: 记录}，记录中的输出文件路径也相对于 folder_path；不存在或已损坏时返回空清单"""
+    try:
+        with open(os.path.join(folder_path, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return manifest.get("files", {}) if manifest.get("params") == PROCESS_PARAMS else {}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def save_manifest(folder_path, files):
+    """先写临时文件再替换，中途退出也不会留下损坏的清单"""
+    manifest_file = os.path.join(folder_path, MANIFEST_NAME)
+    temp_file = manifest_file + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump({"params": PROCESS_PARAMS, "files": files}, f, ensure_ascii=False)
+    os.replace(temp_file, manifest_file)
+
+
+def is_unchanged(folder_path, entry, st):
+    """输入文件的大小和修改时间与清单一致，且上次的输出文件仍然存在且未被改动"""
+    if entry is None or (entry["size"], entry["mtime_ns"]) != (st.st_size, st.st_mtime_ns):
+        return False
+    if entry["output"] is None:  # 上次没有有效数据，没有输出文件
+        return True
+    try:
+        output_st = os.stat(os.path.join(folder_path, entry["output"]))
+    except OSError:
+        return False
+    return (output_st.st_size, output_st.st_mtime_ns) == (entry["output_size"], entry["output_mtime_ns"])
+
+
+def process_folder(folder_path, workers=DEFAULT_WORKERS, on_result=None, should_stop=lambda: False,
+                   incremental=True, cache="use"):
+    """
+    多进程处理文件夹下的所有 .txt 文件。各文件的结果按遍历顺序写入日志（与并发完成的先后无关），
+    每得到一个结果调用 on_result(已完成数, 总数, 结果)。返回已处理的文件数。
+    本程序生成的 correct.* 输出文件不会被当作输入；incremental=True 时根据清单跳过上次处理后未修改的文件，
+    incremental=False（如重建缓存）时全部重新处理，但同样写入新的清单，之后的增量处理不必再全量运行。
+    cache 控制解析缓存，取值见 process_one_file。
+    """
     logging.info(f"开始处理文件夹: {folder_path}")
-    for root, _, files in os.walk(folder_path):
-        for file in files:
-            if file.endswith(".txt"):
-                file_path = os.path.join(root, file)
-                logging.info(f"正在处理文件: {file_path}")
-
-                # 读取并处理文件
-                result = process_file(file_path)
-                new_array = [[data_array[0], float(data_array[4]), float(data_array[3]), 0]
-                             for data_array in result if len(data_array) > 4]
-
-                # 如果 new_array 为空，跳过该文件
-                if not new_array:
-                    logging.warning(f"文件 {file_path} 数据为空，跳过处理。")
-                    continue
-
-                try:
-                    # 找到 A 列的最大值
-                    all_index_1_values = [item[2] for item in new_array]
-                    max_value = max(all_index_1_values)
-                    logging.info(f"文件 {file_path} 的 A 列最大值为: {max_value}")
-
-                    # 处理数据并更新
-                    for item in new_array:
-                        item[3] = round((max_value - item[2]) * 2 / 0.085, 6)
-
-                    # 输出文件路径
-                    logging.info(f"root: {root}")
-                    # 统一路径分隔符为 `/`
-                    normalized_path = root.replace("\\", "/")
-                    # 获取最后一层目录名
-                    last_folder = os.path.basename(normalized_path)
-                    logging.info(f"last_folder: {last_folder}")
-                    output_file = os.path.join(root, f"correct.{last_folder}{file}")
-
-                    # 保存处理结果
-                    with open(output_file, 'w', encoding='utf-8') as out_file:
-                        for item in new_array:
-                            out_file.write(f"{item[1]}\t{item[3]}\n")
-                    logging.info(f"文件 {file_path} 已成功保存为 {output_file}")
-                except Exception as e:
-                    logging.error(f"处理文件 {file_path} 时发生错误: {e}")
+    previous = load_manifest(folder_path) if incremental else {}
+    manifest = {}  # 只保留本次仍然存在的输入文件的记录
+    tasks = []
+    entries = {}  # 相对路径 -> 本次发现时的 stat，处理成功后写入清单
+    skipped = 0
+    for root, _, files in walk(folder_path, with_stat=True):
+        prefix = f"correct.{last_folder_name(root)}"
+        for file, st in files:
+            if not file.endswith(".txt") or file.startswith(prefix):
+                continue
+            file_path = os.path.join(root, file)
+            key = os.path.relpath(file_path, folder_path).replace(os.sep, "/")
+            if incremental and is_unchanged(folder_path, previous.get(key), st):
+                manifest[key] = previous[key]
+                skipped += 1
+                continue
+            entries[file_path] = (key, st)
+            tasks.append((file_path, root, file, cache))
+    if skipped:
+        logging.info(f"跳过 {skipped} 个上次处理后未修改的文件")
+    logging.info(f"共找到 {len(tasks)} 个待处理文件，使用 {workers} 个进程")
+
+    done = 0
+    last_save = time.perf_counter()
+    try:
+        for result in iter_results(tasks, workers, should_stop):
+            for level, message in result["logs"]:
+                logging.log(level, message)
+            if result["error"] is None:
+                key, st = entries[result["file_path"]]
+                entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "output": None}
+                if result["output_file"] is not None:
+                    output_st = os.stat(result["output_file"])
+                    entry.update(output=os.path.relpath(result["output_file"], folder_path),
+                                 output_size=output_st.st_size, output_mtime_ns=output_st.st_mtime_ns)
+                manifest[key] = entry
+            done += 1
+            if on_result is not None:
+                on_result(done, len(tasks), result)
+            if time.perf_counter() - last_save >= MANIFEST_SAVE_INTERVAL:
+                save_manifest(folder_path, manifest)
+                last_save = time.perf_counter()
+    finally:
+        if done:
+            save_manifest(folder_path, manifest)
+    return done
 
 
 def select_folder():
@@ -99,46 +585,153 @@ def select_folder():
         logging.info(f"用户选择了文件夹: {folder_path}")
 
 
-def start_processing():
+def run_processing(folder_path, workers, incremental, cache):
+    """后台线程：处理文件夹，进度和结束事件放入 events 队列，由界面线程取出"""
+    try:
+        done = process_folder(folder_path, workers,
+                              lambda index, total, result: events.put(("progress", index, total, result)),
+                              cancel_event.is_set, incremental, cache)
+        events.put(("done", done, cancel_event.is_set()))
+    except Exception as e:
+        logging.error(f"处理文件夹 {folder_path} 时发生错误: {e}")
+        events.put(("failed", str(e)))
+
+
+def poll_events():
+    """界面线程定时取出后台事件，更新进度条和状态"""
+    try:
+        while True:
+            event = events.get_nowait()
+            if event[0] == "progress":
+                _, index, total, result = event
+                progress_bar.config(maximum=total, value=index)
+                status = f"已处理 {index}/{total}：{os.path.basename(result['file_path'])}"
+                if result["error"]:
+                    status += "（出错，详见日志）"
+                status_label.config(text=status)
+            else:
+                start_button.config(state="normal")
+                rebuild_button.config(state="normal")
+                cancel_button.config(state="disabled")
+                if event[0] == "failed":
+                    messagebox.showerror("错误", f"处理失败：{event[1]}")
+                elif event[2]:
+                    logging.info(f"用户取消了处理，已处理 {event[1]} 个文件")
+                    messagebox.showinfo("已取消", f"已取消，共处理 {event[1]} 个文件。")
+                else:
+                    logging.info("所有文件已处理完成")
+                    messagebox.showinfo("完成", "所有文件已处理完成！")
+    except queue.Empty:
+        pass
+    root.after(100, poll_events)
+
+
+def start_processing(rebuild=False):
+    """rebuild=True 时忽略增量清单和已有解析缓存，全部重新解析并重建缓存"""
     if not selected_folder:
         messagebox.showerror("错误", "请先选择一个文件夹！")
         logging.warning("未选择文件夹，处理中断。")
         return
+    try:
+        workers = int(workers_var.get())
+        if workers < 1:
+            raise ValueError
+    except ValueError:
+        messagebox.showerror("错误", "进程数必须是正整数！")
+        return
+
+    if rebuild:
+        logging.info("用户点击了重建缓存按钮")
+        incremental, cache = False, "rebuild"
+    else:
+        logging.info("用户点击了开始处理按钮")
+        incremental, cache = incremental_var.get(), "use" if use_cache_var.get() else None
+    cancel_event.clear()
+    progress_bar.config(value=0)
+    status_label.config(text="正在扫描文件夹...")
+    start_button.config(state="disabled")
+    rebuild_button.config(state="disabled")
+    cancel_button.config(state="normal")
+    threading.Thread(target=run_processing, args=(selected_folder, workers, incremental, cache)).start()
+
+
+def clear_cache():
+    if not messagebox.askyesno("确认", "确定要清除全部解析缓存吗？下次处理时会重新解析所有文件。"):
+        return
+    freed = clear_column_cache()
+    logging.info(f"已清除解析缓存，释放 {freed / 1024 / 1024:.1f} MB")
+    messagebox.showinfo("完成", f"已清除解析缓存，释放 {freed / 1024 / 1024:.1f} MB。")
+
+
+def cancel_processing():
+    cancel_event.set()
+    cancel_button.config(state="disabled")
+    status_label.config(text="正在取消，等待正在处理的文件完成...")
+
+
+if __name__ == "__main__":
+    # 打包成 exe 后使用进程池需要
+    multiprocessing.freeze_support()
+
+    # 检查试用时间
+    check_trial_period()
 
-    logging.info("用户点击了开始处理按钮")
-    process_folder(selected_folder)
-    logging.info("所有文件已处理完成")
-    messagebox.showinfo("完成", "所有文件已处理完成！")
+    # 创建日志系统
+    log_file_path = setup_logging()
 
+    # 创建 GUI
+    root = tk.Tk()
+    root.title("批量文件处理程序")
+    root.geometry("500x370")
 
-# 检查试用时间
-check_trial_period()
+    selected_folder = ""
+    events = queue.Queue()  # 后台线程产生的事件
+    cancel_event = threading.Event()
 
-# 创建日志系统
-log_file_path = setup_logging()
+    # 文件夹选择按钮
+    select_button = tk.Button(root, text="选择文件夹", command=select_folder, width=20)
+    select_button.pack(pady=10)
 
-# 创建 GUI
-root = tk.Tk()
-root.title("批量文件处理程序")
-root.geometry("500x200")
+    # 显示选择的文件夹路径
+    folder_path_label = tk.Label(root, text="未选择文件夹", fg="blue", wraplength=400)
+    folder_path_label.pack()
 
-selected_folder = ""
+    # 进程数
+    workers_frame = tk.Frame(root)
+    workers_frame.pack(pady=5)
+    tk.Label(workers_frame, text="进程数:").pack(side="left")
+    workers_var = tk.StringVar(value=str(DEFAULT_WORKERS))
+    tk.Entry(workers_frame, textvariable=workers_var, width=5).pack(side="left", padx=5)
+    incremental_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(workers_frame, text="跳过未修改的文件", variable=incremental_var).pack(side="left", padx=5)
+    use_cache_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(workers_frame, text="使用解析缓存", variable=use_cache_var).pack(side="left", padx=5)
 
-# 文件夹选择按钮
-select_button = tk.Button(root, text="选择文件夹", command=select_folder, width=20)
-select_button.pack(pady=10)
+    # 开始 / 取消按钮
+    buttons_frame = tk.Frame(root)
+    buttons_frame.pack(pady=10)
+    start_button = tk.Button(buttons_frame, text="开始处理", command=start_processing, width=20)
+    start_button.pack(side="left", padx=5)
+    cancel_button = tk.Button(buttons_frame, text="取消", command=cancel_processing, width=10, state="disabled")
+    cancel_button.pack(side="left", padx=5)
 
-# 显示选择的文件夹路径
-folder_path_label = tk.Label(root, text="未选择文件夹", fg="blue", wraplength=400)
-folder_path_label.pack()
+    # 解析缓存
+    cache_frame = tk.Frame(root)
+    cache_frame.pack()
+    rebuild_button = tk.Button(cache_frame, text="重建缓存并处理", command=lambda: start_processing(rebuild=True), width=15)
+    rebuild_button.pack(side="left", padx=5)
+    tk.Button(cache_frame, text="清除缓存", command=clear_cache, width=10).pack(side="left", padx=5)
 
-# 开始按钮
-start_button = tk.Button(root, text="开始处理", command=start_processing, width=20)
-start_button.pack(pady=10)
+    # 进度
+    progress_bar = ttk.Progressbar(root, orient="horizontal", length=400, mode="determinate")
+    progress_bar.pack(pady=5)
+    status_label = tk.Label(root, text="", wraplength=400)
+    status_label.pack()
 
-# 日志路径显示
-log_label = tk.Label(root, text=f"日志保存到: {log_file_path}", fg="green", wraplength=400)
-log_label.pack(pady=10)
+    # 日志路径显示
+    log_label = tk.Label(root, text=f"日志保存到: {log_file_path}", fg="green", wraplength=400)
+    log_label.pack(pady=10)
 
-# 运行 GUI
-root.mainloop()
+    # 运行 GUI
+    root.after(100, poll_events)
+    root.mainloop()
@@ -0,0 +1,110 @@
+import os
+import glob
+import pickle
+import hashlib
+
+import pandas as pd
+
+from app_cache import user_cache_dir
+
+CACHE_NAME = "excel_cache"
+CACHE_VERSION = 1  # 缓存格式或读取方式变化时递增，旧缓存自动失效
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 缓存总大小上限，超出时删除最久未使用的条目
+PICKLE_PROTOCOL = 5  # 支持带外缓冲区，大 DataFrame 读写更快（Python 3.8+）
+
+
+def cache_dir():
+    return user_cache_dir(CACHE_NAME)
+
+
+def file_digest(file_path):
+    hasher = hashlib.blake2b()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def cache_key(digest, options):
+    """由文件内容哈希和读取参数（工作表、表头、dtype 等）生成缓存键；pandas 版本也计入，升级后重新解析"""
+    for name, value in options.items():
+        values = value.values() if isinstance(value, dict) else [value]
+        # 类型（如 dtype=object）可以稳定地 repr，函数（usecols、converters 等）不行
+        if any(callable(item) and not isinstance(item, type) for item in values):
+            raise TypeError(f"参数 {name} 是函数，无法作为缓存键，请改用列名列表")
+    spec = repr((CACHE_VERSION, pd.__version__, digest, sorted(options.items())))
+    return hashlib.blake2b(spec.encode("utf-8")).hexdigest()
+
+
+def evict(max_bytes=DEFAULT_MAX_BYTES, keep=None):
+    """按最近使用时间（文件修改时间，命中时会刷新）从旧到新删除条目，直到总大小不超过 max_bytes；keep 指定的条目不删除"""
+    entries = []
+    for path in glob.glob(os.path.join(cache_dir(), "*.pkl")):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+
+def read_excel(file_path, max_bytes=DEFAULT_MAX_BYTES, **options):
+    """
+    带缓存的 pd.read_excel，参数与 pd.read_excel 相同（sheet_name=None 时返回所有工作表的字典）。
+    以文件内容哈希和读取参数为键，命中时直接读取 pickle，不再解析 xlsx/xls；文件内容不变时改名、复制也能命中。
+    """
+    entry = os.path.join(cache_dir(), cache_key(file_digest(file_path), options) + ".pkl")
+    try:
+        with open(entry, 'rb') as f:
+            data = pickle.load(f)
+        os.utime(entry)  # 刷新最近使用时间
+        return data
+    except FileNotFoundError:
+        pass
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+        # 缓存损坏或由不兼容的版本写入，重新解析
+        try:
+            os.remove(entry)
+        except OSError:
+            pass
+
+    data = pd.read_excel(file_path, **options)
+    temp_file = f"{entry}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, 'wb') as f:
+            pickle.dump(data, f, protocol=PICKLE_PROTOCOL)
+        os.replace(temp_file, entry)
+    except OSError as e:
+        # 写缓存失败（磁盘满等）不影响本次结果
+        print(f"写入 Excel 缓存失败: {e}")
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+        return data
+    evict(max_bytes, keep=entry)
+    return data
+
+
+def clear_cache():
+    """删除全部缓存，返回 (删除的条目数, 释放的字节数)"""
+    count = freed = 0
+    for path in glob.glob(os.path.join(cache_dir(), "*.pkl")) + glob.glob(os.path.join(cache_dir(), "*.tmp")):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            continue
+        count += path.endswith(".pkl")
+        freed += size
+    return count, freed
@@ -0,0 +1,92 @@
+import os
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+
+# 列目录主要是在等待文件系统（NAS 上尤其明显），线程数可以远多于 CPU 核数
+DEFAULT_WALK_WORKERS = 16
+
+
+def _match_any(name, patterns):
+    return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def walk_tree(top, visit, max_depth=None, workers=DEFAULT_WALK_WORKERS):
+    """
+    并发遍历目录树的通用框架。
+    visit(node) 在线程池中执行，返回 (子节点列表, 附带结果)，抛出 OSError 的节点被跳过；
+    子节点一返回就立即提交给线程池，因此各子树是并发列举的。
+    产出 (node, 附带结果)，顺序与 os.walk(topdown=True) 的先序顺序相同。
+    """
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    def task(node, depth):
+        try:
+            children, payload = visit(node)
+        except OSError:
+            return None
+        if max_depth is not None and depth >= max_depth:
+            children = []
+        return payload, [(child, executor.submit(task, child, depth + 1)) for child in children]
+
+    try:
+        stack = [(top, executor.submit(task, top, 0))]
+        while stack:
+            node, future = stack.pop()
+            result = future.result()
+            if result is None:
+                continue
+            payload, children = result
+            yield node, payload
+            stack.extend(reversed(children))
+    finally:
+        # 调用方提前结束遍历时，取消尚未开始的列目录任务
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def scan_dir(path, include=None, exclude=None, with_stat=False):
+    """
+    用 os.scandir 列出一个目录，返回 (dirnames, filenames, 需要进入的子目录名)。
+    文件与目录的区分直接用 d_type（DirEntry.is_dir），不额外 stat；
+    与 os.walk 一样，指向目录的符号链接算作子目录但不进入。
+    include 只作用于文件名，exclude 同时作用于文件名和目录名（被排除的目录不再进入）。
+    with_stat=True 时 filenames 的元素为 (文件名, stat 结果)，stat 失败的文件被跳过。
+    """
+    dirnames, filenames, recurse = [], [], []
+    with os.scandir(path) as it:
+        for entry in it:
+            name = entry.name
+            if exclude and _match_any(name, exclude):
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                dirnames.append(name)
+                if not entry.is_symlink():
+                    recurse.append(name)
+                continue
+            if include and not _match_any(name, include):
+                continue
+            if with_stat:
+                try:
+                    filenames.append((name, entry.stat()))
+                except OSError:
+                    continue
+            else:
+                filenames.append(name)
+    return dirnames, filenames, recurse
+
+
+def walk(top, include=None, exclude=None, max_depth=None, workers=DEFAULT_WALK_WORKERS, with_stat=False):
+    """
+    并发版 os.walk：产出 (dirpath, dirnames, filenames)，顺序与 os.walk(top) 相同。
+    include / exclude 为文件名通配符列表（如 ["*.txt"]），max_depth=0 表示只列出 top 本身。
+    与 os.walk 不同，修改产出的 dirnames 不会影响遍历，需要剪枝时请使用 exclude。
+    """
+    def visit(path):
+        dirnames, filenames, recurse = scan_dir(path, include, exclude, with_stat)
+        return [os.path.join(path, name) for name in recurse], (dirnames, filenames)
+
+    for dirpath, (dirnames, filenames) in walk_tree(top, visit, max_depth, workers):
+        yield dirpath, dirnames, filenames
@@ -0,0 +1,472 @@
+import os
+import sys
+import time
+import json
+import errno
+import argparse
+import shutil
+import sqlite3
+import hashlib
+import threading
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+from app_cache import user_cache_dir
+from fast_walk import walk, walk_tree, scan_dir
+
+try:
+    import fcntl  # 仅 Linux/macOS 可用，用于 reflink 克隆
+except ImportError:
+    fcntl = None
+
+INDEX_CACHE_NAME = "file_search_index"  # 索引数据库所在的缓存子目录
+
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_COPY_WORKERS = 4
+FICLONE = 0x40049409  # Linux ioctl：在 btrfs / XFS 等文件系统上做写时复制克隆
+# 副本方式：每个源文件只从搜索目录读取一次，其余 N-1 份由第一份生成
+DUPLICATE_MODES = ("copy", "hardlink", "reflink")
+
+
+def fast_copy2(src, dst):
+    """
+    与 shutil.copy2 相同，但在支持的系统上优先使用 os.copy_file_range，
+    让内核（或 NFS/SMB 服务端）完成数据搬运；不支持时退回 shutil.copy2（内部会用 sendfile）。
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), COPY_CHUNK_SIZE) > 0:
+                    pass
+            shutil.copystat(src, dst)
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP):
+                raise
+    shutil.copy2(src, dst)
+
+
+def reflink_file(src, dst):
+    """写时复制克隆（仅 Linux），不支持时抛出 OSError"""
+    if fcntl is None or not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "当前系统不支持 reflink")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    shutil.copystat(src, dst)
+
+
+def copy_with_duplicates(src, dsts, mode="copy"):
+    """
+    把 src 复制到 dsts[0]，再由 dsts[0] 生成其余副本（硬链接 / 克隆，不支持时在本地复制）。
+    返回 [(dst, 方式, 实际复制的字节数), ...]，方式为 copy / hardlink / reflink。
+    """
+    results = []
+    first = dsts[0]
+    size = os.path.getsize(src)
+    for i, dst in enumerate(dsts):
+        # 先删除旧文件，避免覆盖上次留下的硬链接时连带修改其他副本
+        if os.path.lexists(dst):
+            os.remove(dst)
+        if i == 0:
+            fast_copy2(src, dst)
+            results.append((dst, "copy", size))
+            continue
+        if mode == "hardlink":
+            try:
+                os.link(first, dst)
+                results.append((dst, "hardlink", 0))
+                continue
+            except OSError:
+                pass
+        elif mode == "reflink":
+            try:
+                reflink_file(first, dst)
+                results.append((dst, "reflink", 0))
+                continue
+            except OSError:
+                if os.path.lexists(dst):
+                    os.remove(dst)
+        fast_copy2(first, dst)
+        results.append((dst, "copy", size))
+    return results
+
+def copy_sequence(jobs, mode="copy"):
+    """
+    按顺序依次执行 [(src, dsts), ...]，用于目标文件名相同的一组源文件：后面的文件覆盖前面的，与串行复制结果一致。
+    返回每个任务的结果列表，元素为 copy_with_duplicates 的返回值或复制时抛出的 OSError。
+    """
+    outcomes = []
+    for src, dsts in jobs:
+        try:
+            outcomes.append(copy_with_duplicates(src, dsts, mode))
+        except OSError as e:
+            outcomes.append(e)
+    return outcomes
+
+
+class FileNameIndex:
+    """文件名索引：只遍历一次目录树，按文件名排序后用二分查找做前缀匹配"""
+
+    def __init__(self, entries):
+        # entries: [(文件名, 完整路径), ...]
+        self.entries = sorted(entries)
+        self.names = [name for name, _ in self.entries]
+
+    @classmethod
+    def build(cls, search_dir, stop_check=None):
+        entries = []
+        for root, dirs, files in walk(search_dir):
+            if stop_check is not None and stop_check():
+                return None
+            for file in files:
+                entries.append((file, os.path.join(root, file)))
+        return cls(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def prefix_search(self, prefix):
+        """返回文件名以 prefix 开头的所有文件路径（与 file.startswith(prefix) 结果一致）"""
+        matches = []
+        i = bisect_left(self.names, prefix)
+        while i < len(self.names) and self.names[i].startswith(prefix):
+            matches.append(self.entries[i][1])
+            i += 1
+        return matches
+
+
+class PersistentFileIndex:
+    """
+    保存在本地缓存目录中的 SQLite 文件名索引，每个搜索目录对应一个数据库文件。
+    刷新时只重新列出 mtime 发生变化的目录（目录内新增、删除、重命名文件都会改变目录的 mtime），
+    其余目录直接沿用库里的记录。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS dirs (rel TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER);
+        CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+        CREATE TABLE IF NOT EXISTS files (dir TEXT NOT NULL, name TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS files_name ON files(name);
+        CREATE INDEX IF NOT EXISTS files_dir ON files(dir);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+
+    def __init__(self, search_dir):
+        self.search_dir = search_dir
+        self.conn = sqlite3.connect(self.db_path_for(search_dir), timeout=30)
+        self.conn.executescript(self.SCHEMA)
+
+    @staticmethod
+    def db_path_for(search_dir):
+        key = os.path.normcase(os.path.abspath(search_dir))
+        digest = hashlib.md5(key.encode("utf-8", "surrogatepass")).hexdigest()
+        return os.path.join(user_cache_dir(INDEX_CACHE_NAME), f"{digest}.sqlite")
+
+    @classmethod
+    def status(cls, search_dir):
+        """读取索引的文件数和上次刷新时间，索引不存在时返回 None"""
+        db_path = cls.db_path_for(search_dir)
+        if not os.path.exists(db_path):
+            return None
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+        except sqlite3.Error:
+            return None
+        finally:
+            conn.close()
+        if "refreshed_at" not in meta:
+            return None
+        return int(meta["file_count"]), datetime.datetime.fromisoformat(meta["refreshed_at"])
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def refresh(self, stop_check=None):
+        """
+        增量刷新索引，返回 (重新列出的目录数, 目录总数)；被中断时回滚并返回 None。
+        各目录的 stat / 列举在线程池中并发执行，数据库只在当前线程写入。
+        """
+        conn = self.conn
+        known = {}
+        children_of = {}
+        for rel, parent, mtime_ns in conn.execute("SELECT rel, parent, mtime_ns FROM dirs"):
+            known[rel] = mtime_ns
+            children_of.setdefault(parent, []).append(rel)
+
+        def visit(rel):
+            path = os.path.join(self.search_dir, rel) if rel else self.search_dir
+            mtime_ns = os.stat(path).st_mtime_ns
+            if rel in known and known[rel] == mtime_ns:
+                return children_of.get(rel, []), None
+            try:
+                _, files, subdirs = scan_dir(path)
+            except OSError:
+                # 无法读取的目录按 os.walk 的做法视为空目录，下次刷新时重试
+                files, subdirs, mtime_ns = [], [], None
+            children = [os.path.join(rel, name) if rel else name for name in subdirs]
+            return children, (mtime_ns, files, children)
+
+        seen = set()
+        listed = 0
+        for rel, listing in walk_tree("", visit):
+            if stop_check is not None and stop_check():
+                conn.rollback()
+                return None
+            seen.add(rel)
+            if listing is None:
+                continue
+            mtime_ns, files, children = listing
+            listed += 1
+            conn.execute("DELETE FROM files WHERE dir = ?", (rel,))
+            conn.executemany("INSERT INTO files (dir, name) VALUES (?, ?)", [(rel, name) for name in files])
+            conn.execute("INSERT OR REPLACE INTO dirs (rel, parent, mtime_ns) VALUES (?, ?, ?)",
+                         (rel, os.path.dirname(rel) if rel else None, mtime_ns))
+            # 先登记子目录，这样即使子目录这次访问失败，下次也还能找到它
+            conn.executemany("INSERT OR IGNORE INTO dirs (rel, parent, mtime_ns) VALUES (?, ?, NULL)",
+                             [(child, rel) for child in children])
+
+        # 清理已被删除或移走的目录
+        gone = [(r,) for (r,) in conn.execute("SELECT rel FROM dirs") if r not in seen]
+        conn.executemany("DELETE FROM files WHERE dir = ?", gone)
+        conn.executemany("DELETE FROM dirs WHERE rel = ?", gone)
+
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('file_count', ?)", (str(len(self)),))
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('refreshed_at', ?)",
+                     (datetime.datetime.now().isoformat(timespec="seconds"),))
+        conn.commit()
+        return listed, len(seen)
+
+    def rebuild(self, stop_check=None):
+        """清空索引后重新完整扫描"""
+        self.conn.execute("DELETE FROM files")
+        self.conn.execute("DELETE FROM dirs")
+        self.conn.execute("DELETE FROM meta")
+        return self.refresh(stop_check)
+
+    def prefix_search(self, prefix):
+        """返回文件名以 prefix 开头的所有文件路径（与 file.startswith(prefix) 结果一致）"""
+        matches = []
+        # SQLite 默认按 UTF-8 字节比较，与 Python 字符串按码点排序的顺序一致
+        for dir_rel, name in self.conn.execute(
+                "SELECT dir, name FROM files WHERE name >= ? ORDER BY name", (prefix,)):
+            if not name.startswith(prefix):
+                break
+            matches.append(os.path.join(self.search_dir, dir_rel, name))
+        return matches
+
+
+def parse_keyword_lines(lines):
+    """解析关键字，每行格式：文件名 [数量]，数量缺省为 1；返回 [(文件名, 数量), ...]"""
+    filenames = []
+    for line in lines:
+        parts = line.strip().split()
+        if not parts:
+            continue
+        fname = parts[0]
+        count = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 1
+        filenames.append((fname, count))
+    return filenames
+
+
+class FileSearchEngine:
+    """
+    按关键字前缀搜索文件并复制到保存目录，不依赖任何界面。
+    进度以事件字典的形式交给 on_event 回调（在调用 run 的线程里触发），事件类型见 event 字段：
+    index_start / index_fallback / index_ready / match / copy / copy_error / progress / stopped / done。
+    """
+
+    def __init__(self, search_dir, save_dir, workers=DEFAULT_COPY_WORKERS, mode="copy",
+                 use_index_cache=True, on_event=None):
+        if mode not in DUPLICATE_MODES:
+            raise ValueError(f"未知的副本方式: {mode}")
+        self.search_dir = search_dir
+        self.save_dir = save_dir
+        self.workers = max(1, workers)
+        self.mode = mode
+        self.use_index_cache = use_index_cache
+        self.on_event = on_event
+        self._stop = threading.Event()
+
+    def stop(self):
+        """请求停止（可在任意线程调用）"""
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def emit(self, event, **fields):
+        if self.on_event is not None:
+            self.on_event(dict(event=event, **fields))
+
+    def open_index(self, rebuild=False):
+        """打开并刷新持久索引；不可用或未启用时退回到一次性的内存索引。被中断时返回 None"""
+        started = time.perf_counter()
+        if self.use_index_cache:
+            index = None
+            try:
+                index = PersistentFileIndex(self.search_dir)
+                self.emit("index_start", search_dir=self.search_dir, persistent=True, rebuild=rebuild)
+                refresh = index.rebuild if rebuild else index.refresh
+                result = refresh(stop_check=self._stop.is_set)
+                if result is None:
+                    index.close()
+                    return None
+                listed, total = result
+                self.emit("index_ready", persistent=True, files=len(index), listed_dirs=listed, total_dirs=total,
+                          seconds=round(time.perf_counter() - started, 3))
+                return index
+            except (sqlite3.Error, OSError, UnicodeError) as e:
+                # UnicodeError：Linux 上非 UTF-8 编码的文件名以代理字符表示，无法写入 SQLite，改用内存索引
+                if index is not None:
+                    index.close()
+                self.emit("index_fallback", error=str(e))
+
+        self.emit("index_start", search_dir=self.search_dir, persistent=False, rebuild=rebuild)
+        index = FileNameIndex.build(self.search_dir, stop_check=self._stop.is_set)
+        if index is not None:
+            self.emit("index_ready", persistent=False, files=len(index),
+                      seconds=round(time.perf_counter() - started, 3))
+        return index
+
+    def run(self, filenames, rebuild_index=False):
+        """执行搜索和复制，返回汇总统计（与 done / stopped 事件内容相同）；rebuild_index=True 时先完整重建持久索引"""
+        stats = {"lines": len(filenames), "done": 0, "matches": 0, "files_copied": 0, "bytes_copied": 0,
+                 "links": 0, "errors": 0}
+        started = time.perf_counter()
+
+        def snapshot():
+            elapsed = time.perf_counter() - started
+            rate = dict(stats, elapsed=round(elapsed, 3))
+            rate["files_per_sec"] = round(stats["files_copied"] / elapsed, 2) if elapsed else 0.0
+            rate["mb_per_sec"] = round(stats["bytes_copied"] / elapsed / 1024 / 1024, 2) if elapsed else 0.0
+            return rate
+
+        # 先刷新文件名索引，之后每个关键字都在索引里查找，不再遍历磁盘
+        index = self.open_index(rebuild=rebuild_index)
+        if index is None:
+            self.emit("stopped", **snapshot())
+            return snapshot()
+
+        global_index = 1  # 全局序号前缀（每一行关键字一个序号）
+        total = len(filenames)
+
+        # 复制任务在线程池中并行执行；事件按提交顺序依次发出，保证与串行执行时顺序一致
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = deque()  # (事件名, 字段) 或 ("copy", 行号, 源文件, future, 在该任务中的序号)
+
+        def drain(limit):
+            while len(pending) > limit:
+                item = pending.popleft()
+                if item[0] != "copy":
+                    if item[0] == "progress":
+                        stats["done"] = item[1]["done"]
+                        self.emit("progress", total=total, **snapshot())
+                    else:
+                        self.emit(item[0], **item[1])
+                    continue
+                _, line, src, future, position = item
+                results = future.result()[position]
+                if isinstance(results, OSError):
+                    stats["errors"] += 1
+                    self.emit("copy_error", line=line, src=src, error=str(results))
+                    continue
+                for dst, method, nbytes in results:
+                    if method == "copy":
+                        stats["files_copied"] += 1
+                    else:
+                        stats["links"] += 1
+                    stats["bytes_copied"] += nbytes
+                    self.emit("copy", line=line, src=src, dst=dst, method=method, bytes=nbytes)
+
+        try:
+            for i, (fname, count) in enumerate(filenames, start=1):
+                if self._stop.is_set():
+                    break
+
+                # 收集所有匹配到的文件（前缀匹配）
+                matches = index.prefix_search(fname)
+                stats["matches"] += len(matches)
+                pending.append(("match", {"line": i, "total": total, "keyword": fname, "count": count,
+                                          "matches": len(matches)}))
+
+                # 对同一关键字下的所有匹配文件，逐个复制；该关键字的全局前缀保持一致
+                if matches:
+                    # 不同目录下的同名文件会得到相同的目标文件名，这些文件放在同一个任务里按路径顺序依次复制，
+                    # 与串行执行一样由排在最后的文件覆盖前面的，不会在线程池中同时写同一个目标文件
+                    groups = {}
+                    ordered = []
+                    for src in sorted(matches):
+                        name, ext = os.path.splitext(os.path.basename(src))
+                        dsts = [os.path.join(self.save_dir, f"{global_index}_{name}_{c}{ext}")
+                                for c in range(1, count + 1)]
+                        if dsts:
+                            key = os.path.normcase(name + ext)
+                            jobs = groups.setdefault(key, [])
+                            ordered.append((src, key, len(jobs)))
+                            jobs.append((src, dsts))
+                    futures = {}
+                    for src, key, position in ordered:
+                        # 每组在遇到第一个文件时提交，正在进行的任务数仍由 drain 限制
+                        if position == 0:
+                            futures[key] = executor.submit(copy_sequence, groups[key], self.mode)
+                        pending.append(("copy", i, src, futures[key], position))
+                        drain(self.workers * 4)
+
+                    # 这一行（一个关键字）处理完后，再递增全局前缀
+                    global_index += 1
+
+                pending.append(("progress", {"done": i}))
+                drain(self.workers * 4)
+
+            drain(0)
+        finally:
+            executor.shutdown()
+            if isinstance(index, PersistentFileIndex):
+                index.close()
+
+        result = snapshot()
+        self.emit("stopped" if self._stop.is_set() else "done", **result)
+        return result
+
+
+def main(argv=None):
+    """命令行入口：搜索并复制文件，进度以 JSON Lines 输出到标准输出"""
+    parser = argparse.ArgumentParser(description="按关键字前缀搜索文件并复制到保存目录（无界面版）")
+    parser.add_argument("keyword_file", help="关键字文件，每行：文件名 [数量]")
+    parser.add_argument("search_dir", help="搜索目录")
+    parser.add_argument("save_dir", help="保存目录")
+    parser.add_argument("--workers", type=int, default=DEFAULT_COPY_WORKERS, help="复制线程数")
+    parser.add_argument("--mode", choices=DUPLICATE_MODES, default="copy", help="多份副本的生成方式")
+    parser.add_argument("--no-index-cache", action="store_true", help="不使用持久索引，每次重新扫描目录")
+    parser.add_argument("--rebuild-index", action="store_true", help="搜索前完整重建持久索引")
+    parser.add_argument("--encoding", default="utf-8-sig", help="关键字文件编码")
+    args = parser.parse_args(argv)
+
+    with open(args.keyword_file, "r", encoding=args.encoding) as f:
+        filenames = parse_keyword_lines(f)
+
+    def print_event(event):
+        try:
+            print(json.dumps(event, ensure_ascii=False), flush=True)
+        except UnicodeEncodeError:
+            # 非 UTF-8 编码的文件名含代理字符，转义成 \udcxx 输出，读取方解析 JSON 后仍能得到原路径
+            print(json.dumps(event), flush=True)
+
+    engine = FileSearchEngine(args.search_dir, args.save_dir, workers=args.workers, mode=args.mode,
+                              use_index_cache=not args.no_index_cache, on_event=print_event)
+    try:
+        result = engine.run(filenames, rebuild_index=args.rebuild_index and not args.no_index_cache)
+    except KeyboardInterrupt:
+        engine.stop()
+        return 130
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
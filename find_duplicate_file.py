@@ -1,11 +1,43 @@
 import os
 import sys
+import csv
+import gzip
+import json
+import socket
+import argparse
+import filecmp
+import mmap
+import time
+import sqlite3
 import hashlib
-import pandas as pd
+import tempfile
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Border, Side, Alignment
+from fast_walk import walk
+from app_cache import user_cache_dir
 from datetime import datetime
 import tkinter as tk
 from tkinter import filedialog, messagebox
 
+# 可选的哈希算法（界面名称 -> hashlib 名称），BLAKE2b 在 64 位 CPU 上明显快于 MD5
+HASH_ALGORITHMS = {"MD5": "md5", "BLAKE2b": "blake2b"}
+HASH_BUFFER_SIZE = 1024 * 1024  # 每个线程复用的读缓冲区大小
+MMAP_THRESHOLD = 64 * 1024 * 1024  # 超过该大小的文件用 mmap 直接交给 hashlib
+_thread_buffers = threading.local()
+HASH_CACHE_NAME = "find_duplicate_file"  # 哈希缓存数据库所在的缓存子目录
+EXCEL_MAX_ROWS = 1048576  # Excel 单个工作表的行数上限（含表头）
+PARTIAL_BLOCK_SIZE = 64 * 1024  # 内容查重时先比较文件首尾各 64KB，不一致的文件不必完整读取
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.gif', '.webp')
+DHASH_ALGORITHM = "dhash"  # 感知哈希在哈希缓存中使用的算法名
+DEFAULT_IMAGE_DISTANCE = 6  # 相似图片的默认汉明距离阈值（64 位 dHash）
+MANIFEST_FORMAT = "find_duplicate_file-manifest"  # 扫描清单文件头中的格式标识
+MANIFEST_VERSION = 1
+
 
 def check_usage_expiry():
     """
@@ -19,71 +51,978 @@ def check_usage_expiry():
         sys.exit(1)
 
 
-def calculate_md5(file_path):
+def calculate_hash(file_path, algorithm="md5"):
     """
-    计算文件的 MD5 哈希值。
+    计算文件的哈希值，读取失败时返回 None。
+    小文件通过每个线程复用的大缓冲区 readinto 读取，大文件用 mmap 一次交给 hashlib（计算时释放 GIL）。
     """
-    hash_md5 = hashlib.md5()
+    hasher = hashlib.new(algorithm)
     try:
         with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
+            if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    hasher.update(mm)
+            else:
+                buf = getattr(_thread_buffers, "buf", None)
+                if buf is None:
+                    buf = _thread_buffers.buf = bytearray(HASH_BUFFER_SIZE)
+                view = memoryview(buf)
+                while True:
+                    n = f.readinto(buf)
+                    if not n:
+                        break
+                    hasher.update(view[:n])
     except Exception as e:
         print(f"[错误] 无法读取文件: {file_path}，错误: {e}")
         return None
-    print(f"[信息] 计算 MD5 成功: {file_path}")
-    return hash_md5.hexdigest()
+    return hasher.hexdigest()
 
 
-def find_version_conflicts(root_dir, output_file):
+def calculate_partial_hash(file_path, algorithm="md5"):
     """
-    找出文件名相同但 MD5 不同的文件，并导出到 Excel 文件。
+    只读取文件开头和结尾各 PARTIAL_BLOCK_SIZE 字节计算哈希，用于内容查重的预筛选，读取失败时返回 None。
     """
-    file_info = []  # 保存文件信息
+    hasher = hashlib.new(algorithm)
+    try:
+        with open(file_path, "rb") as f:
+            hasher.update(f.read(PARTIAL_BLOCK_SIZE))
+            size = os.fstat(f.fileno()).st_size
+            if size > PARTIAL_BLOCK_SIZE:
+                f.seek(max(PARTIAL_BLOCK_SIZE, size - PARTIAL_BLOCK_SIZE))
+                hasher.update(f.read(PARTIAL_BLOCK_SIZE))
+    except Exception as e:
+        print(f"[错误] 无法读取文件: {file_path}，错误: {e}")
+        return None
+    return hasher.hexdigest()
 
-    print(f"[信息] 正在扫描文件夹: {root_dir}")
 
-    # 遍历文件夹，收集所有文件的信息
+def calculate_dhash(file_path, algorithm=DHASH_ALGORITHM):
+    """
+    计算图片的 64 位差异哈希（dHash），返回 16 位十六进制字符串，无法解码时返回 None。
+    JPEG 通过 draft 模式直接按缩小的尺寸解码，大图不必完整解码；
+    转灰度后缩放到 9x8，比较每行相邻像素的明暗，因此对缩放、重新压缩、RGB/CMYK 转换不敏感。
+    algorithm 参数只为与 calculate_hash 保持相同的调用方式。
+    """
+    from PIL import Image  # 只有相似图片模式需要 Pillow
+
+    try:
+        with Image.open(file_path) as image:
+            image.draft("L", (64, 64))
+            pixels = list(image.convert("L").resize((9, 8), Image.BILINEAR).getdata())
+    except Exception as e:
+        print(f"[错误] 无法读取图片: {file_path}，错误: {e}")
+        return None
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{value:016x}"
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """
+    以汉明距离为度量的 BK 树，用于查找距离不超过 radius 的所有哈希值。
+    利用三角不等式只访问可能命中的子树，避免两两比较。
+    """
+
+    def __init__(self):
+        self.root = None  # 节点为 [值, {距离: 子节点}]
+
+    def add(self, value):
+        if self.root is None:
+            self.root = [value, {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [value, {}]
+                return
+            node = child
+
+    def search(self, value, radius):
+        """返回 [(哈希值, 距离), ...]"""
+        results = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= radius:
+                results.append((node_value, distance))
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return results
+
+
+def calculate_md5(file_path):
+    """
+    计算文件的 MD5 哈希值。
+    """
+    return calculate_hash(file_path, "md5")
+
+
+def is_rotational_disk(path):
+    """
+    判断路径所在磁盘是否为机械硬盘。仅 Linux 可以通过 /sys/dev/block/<主:次>/queue/rotational 判断，
+    其他系统（以及网络盘）返回 False。
+    """
+    try:
+        dev = os.stat(path).st_dev
+        sys_dir = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+        # 分区本身没有 queue 目录，需要到上一级的整块磁盘下查找
+        for candidate in (os.path.join(sys_dir, "queue", "rotational"),
+                          os.path.join(sys_dir, "..", "queue", "rotational")):
+            if os.path.exists(candidate):
+                with open(candidate) as f:
+                    return f.read().strip() == "1"
+    except (OSError, AttributeError, ValueError):
+        pass
+    return False
+
+
+def default_hash_workers(path):
+    """
+    默认并发数：机械硬盘并发读取会让磁头来回寻道，只用 1 个；SSD / 网络盘按 CPU 核数，最多 8 个。
+    """
+    if is_rotational_disk(path):
+        return 1
+    return min(8, os.cpu_count() or 4)
+
+
+class HashProgress:
+    """
+    按固定时间间隔打印哈希进度和吞吐量（MB/s、文件/s），代替逐个文件打印。
+    """
+
+    def __init__(self, total_files, total_bytes, interval=1.0):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.files = 0
+        self.bytes = 0
+        self.start = self.last = time.perf_counter()
+
+    def add(self, nbytes):
+        self.files += 1
+        self.bytes += nbytes
+        now = time.perf_counter()
+        if now - self.last >= self.interval or self.files == self.total_files:
+            self.last = now
+            elapsed = max(now - self.start, 1e-6)
+            mb = self.bytes / 1024 / 1024
+            print(f"[进度] 已计算 {self.files}/{self.total_files} 个文件"
+                  f"（{mb:.1f}/{self.total_bytes / 1024 / 1024:.1f} MB），"
+                  f"{mb / elapsed:.1f} MB/s，{self.files / elapsed:.1f} 文件/s")
+
+
+def hash_files(files, algorithm="md5", workers=None, use_processes=False, hash_func=calculate_hash):
+    """
+    并发计算一批文件的哈希值，按输入顺序产出 (路径, 摘要)，读取失败的文件摘要为 None。
+    files 为 [(路径, 文件大小), ...]，文件大小只用于统计吞吐量。
+    use_processes=True 时使用进程池（适合 CPU 成为瓶颈的高速 SSD），否则使用线程池。
+    hash_func 为实际计算哈希的模块级函数（进程池要求可被 pickle），默认计算完整哈希。
+    """
+    files = list(files)
+    if not files:
+        return
+    workers = workers or default_hash_workers(os.path.dirname(files[0][0]))
+    progress = HashProgress(len(files), sum(size for _, size in files))
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        pending = deque()
+        for file_path, size in files:
+            pending.append((file_path, size, executor.submit(hash_func, file_path, algorithm)))
+            # 只保留有限数量的待完成任务，避免一次性为上百万个文件创建任务
+            if len(pending) >= workers * 8:
+                done_path, done_size, future = pending.popleft()
+                digest = future.result()
+                progress.add(done_size)
+                yield done_path, digest
+        while pending:
+            done_path, done_size, future = pending.popleft()
+            digest = future.result()
+            progress.add(done_size)
+            yield done_path, digest
+
+
+class ScanRecord:
+    """
+    一个文件的扫描结果。使用 __slots__ 节省内存，同一目录下的文件共用同一个 dirpath 字符串，完整路径按需拼接。
+    """
+
+    __slots__ = ("dirpath", "name", "size", "mtime_ns", "dev", "inode")
+
+    def __init__(self, dirpath, name, st):
+        self.dirpath = dirpath
+        self.name = name
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.dev = st.st_dev
+        self.inode = st.st_ino
+
+    @property
+    def path(self):
+        return os.path.join(self.dirpath, self.name)
+
+    def refresh_identity(self):
+        """
+        用 os.stat 重新读取 st_dev/st_ino。Windows 上 DirEntry.stat() 返回的这两个值恒为 0，
+        只有判断硬链接、是否同一磁盘时才需要真实值，因此只对 inode 为 0 的大小相同的候选文件调用。
+        """
+        st = os.stat(self.path)
+        self.dev = st.st_dev
+        self.inode = st.st_ino
+
+
+def scan_files(root_dir):
+    """
+    遍历文件夹，逐个产出 ScanRecord（只列目录和读取元数据，不读取文件内容），每秒打印一次进度。
+    """
     total_files = 0
-    for dirpath, _, filenames in os.walk(root_dir):
-        for filename in filenames:
+    last_report = time.perf_counter()
+    for dirpath, _, filenames in walk(root_dir, with_stat=True):
+        for filename, st in filenames:
             total_files += 1
-            file_path = os.path.join(dirpath, filename)
-            print(f"[扫描] 正在处理文件: {file_path}")
-            md5_hash = calculate_md5(file_path)
-            if md5_hash:
-                file_info.append({"filename": filename, "file_path": file_path, "md5": md5_hash})
+            yield ScanRecord(dirpath, filename, st)
+        if time.perf_counter() - last_report >= 1.0:
+            last_report = time.perf_counter()
+            print(f"[扫描] 已发现 {total_files} 个文件，当前目录: {dirpath}")
+
+
+class ReportWriter:
+    """
+    流式写出报告，不在内存中保留全部结果。
+    .csv 文件逐行写出（UTF-8 带 BOM，Excel 可直接打开）；.xlsx 文件使用 openpyxl 的 write-only 模式，
+    超过 Excel 单表行数上限时自动新建工作表（Sheet1、Sheet1_2、...），每个工作表都带表头。
+    """
+
+    def __init__(self, output_file, headers, sheet_title="Sheet1"):
+        self.output_file = output_file
+        self.headers = headers
+        self.sheet_title = sheet_title
+        self.rows = 0
+        if output_file.lower().endswith(".csv"):
+            self.csv_file = open(output_file, "w", encoding="utf-8-sig", newline="")
+            self.csv_writer = csv.writer(self.csv_file)
+            self.csv_writer.writerow(headers)
+            self.workbook = None
+        else:
+            self.csv_file = None
+            self.workbook = Workbook(write_only=True)
+            self.sheet = None
+            self.sheet_rows = 0
+            self.sheet_count = 0
+
+    def _new_sheet(self):
+        self.sheet_count += 1
+        title = self.sheet_title if self.sheet_count == 1 else f"{self.sheet_title}_{self.sheet_count}"
+        self.sheet = self.workbook.create_sheet(title)
+        # 表头样式与 pandas.to_excel 保持一致：加粗、细边框、水平居中
+        thin = Side(style="thin")
+        header_cells = []
+        for header in self.headers:
+            cell = WriteOnlyCell(self.sheet, value=header)
+            cell.font = Font(bold=True)
+            cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+            cell.alignment = Alignment(horizontal="center", vertical="top")
+            header_cells.append(cell)
+        self.sheet.append(header_cells)
+        self.sheet_rows = 1
+
+    def write_row(self, row):
+        self.rows += 1
+        if self.workbook is None:
+            self.csv_writer.writerow(row)
+            return
+        if self.sheet is None or self.sheet_rows >= EXCEL_MAX_ROWS:
+            self._new_sheet()
+        self.sheet.append(row)
+        self.sheet_rows += 1
+
+    def close(self):
+        if self.workbook is None:
+            self.csv_file.close()
+        else:
+            if self.sheet is None:
+                self._new_sheet()
+            self.workbook.save(self.output_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class HashCache:
+    """
+    本地 SQLite 哈希缓存。以 (路径, 大小, mtime_ns, inode) 判断文件是否变化，未变化的文件直接复用上次的摘要。
+    Windows 上只有内容模式会补读真实 inode，其他模式记录为 0，因此任一方为 0 时不比较 inode。
+    打开时一次性读入 root_dir 下的全部记录，查询不再访问数据库。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS hashes (
+            path TEXT NOT NULL,
+            algorithm TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            digest TEXT NOT NULL,
+            PRIMARY KEY (path, algorithm)
+        );
+    """
+
+    def __init__(self, root_dir, algorithm):
+        self.root_dir = root_dir
+        self.algorithm = algorithm
+        root_key = os.path.normcase(os.path.abspath(root_dir))
+        self.prefix = root_key if root_key.endswith(os.sep) else root_key + os.sep
+        self.conn = sqlite3.connect(os.path.join(user_cache_dir(HASH_CACHE_NAME), "hash_cache.sqlite"), timeout=30)
+        self.conn.executescript(self.SCHEMA)
+        self.rows = {}
+        for path, size, mtime_ns, inode, digest in self.conn.execute(
+                "SELECT path, size, mtime_ns, inode, digest FROM hashes "
+                "WHERE algorithm = ? AND path >= ? AND path < ?", (algorithm, *self._prefix_range())):
+            self.rows[path] = (size, mtime_ns, inode, digest)
+        self.hits = 0
+
+    def _prefix_range(self):
+        return self.prefix, self.prefix[:-1] + chr(ord(self.prefix[-1]) + 1)
+
+    def key_for(self, file_path):
+        """缓存中的路径：规范化后的绝对路径，与用户输入根目录的写法无关"""
+        return self.prefix + file_path[len(self.root_dir):].lstrip("\\/")
+
+    def get(self, record):
+        row = self.rows.get(self.key_for(record.path))
+        if (row is not None and row[:2] == (record.size, record.mtime_ns)
+                and (row[2] == record.inode or not row[2] or not record.inode)):
+            self.hits += 1
+            return row[3]
+        return None
+
+    def put_many(self, items):
+        """items 为 [(ScanRecord, 摘要), ...]"""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO hashes (path, algorithm, size, mtime_ns, inode, digest) VALUES (?, ?, ?, ?, ?, ?)",
+            [(self.key_for(record.path), self.algorithm, record.size, record.mtime_ns, record.inode, digest)
+             for record, digest in items])
+        self.conn.commit()
+
+    def prune(self, scanned_paths):
+        """删除 root_dir 下本次扫描时已不存在的文件的记录（所有算法），返回删除的路径数"""
+        seen = {self.key_for(path) for path in scanned_paths}
+        stale = [(path,) for (path,) in self.conn.execute(
+            "SELECT DISTINCT path FROM hashes WHERE path >= ? AND path < ?", self._prefix_range()) if path not in seen]
+        self.conn.executemany("DELETE FROM hashes WHERE path = ?", stale)
+        self.conn.commit()
+        return len(stale)
+
+    def close(self):
+        self.conn.close()
+
+
+def file_key(record):
+    """同一文件的多个硬链接（相同 st_dev/st_ino）共用一个键，只需计算一次哈希"""
+    return (record.dev, record.inode) if record.inode else record.path
+
+
+def hash_entries(records, algorithm="md5", workers=None, use_processes=False, cache=None,
+                 hash_func=calculate_hash):
+    """
+    计算一批 ScanRecord 的哈希值，返回 {file_key: 摘要}，读取失败的文件不在结果中。
+    提供 cache 时，未变化的文件直接使用缓存，新计算的结果写回缓存。
+    """
+    digests = {}
+    jobs = []
+    for record in records:
+        key = file_key(record)
+        if key in digests:
+            continue
+        digest = cache.get(record) if cache is not None else None
+        digests[key] = digest
+        if digest is None:
+            jobs.append((key, record))
+    if cache is not None:
+        print(f"[信息] 哈希缓存命中 {cache.hits} 个文件，需要重新计算 {len(jobs)} 个文件")
+
+    computed = []
+    hashed = hash_files([(record.path, record.size) for _, record in jobs], algorithm, workers, use_processes,
+                        hash_func)
+    for (key, record), (_, digest) in zip(jobs, hashed):
+        digests[key] = digest
+        if digest is not None:
+            computed.append((record, digest))
+    if cache is not None and computed:
+        cache.put_many(computed)
+    return {key: digest for key, digest in digests.items() if digest is not None}
+
+
+def find_version_conflicts(root_dir, output_file, algorithm="md5", workers=None, use_processes=False,
+                           use_cache=True):
+    """
+    找出文件名相同但 MD5 不同的文件，并导出到 Excel 文件（output_file 以 .csv 结尾时导出为 CSV）。
+    只有文件名出现两次及以上的文件才需要计算 MD5，其余文件只列目录、不读取内容。
+    algorithm 可选 md5 / blake2b，workers 为哈希并发数（None 表示按磁盘类型自动选择）；
+    use_cache=True 时未变化的文件复用本地哈希缓存中的结果。
+    返回检测到的冲突文件名数量。
+    """
+    algorithm_name = next(name for name, value in HASH_ALGORITHMS.items() if value == algorithm)
+    print(f"[信息] 正在扫描文件夹: {root_dir}")
+
+    # 第一步：遍历文件夹，按文件名分组（只列目录，不读文件）
+    total_files = 0
+    by_name = {}
+    for record in scan_files(root_dir):
+        total_files += 1
+        by_name.setdefault(record.name, []).append(record)
 
-    print(f"[信息] 扫描完成，共处理文件数: {total_files}")
+    # 第二步：去掉只出现一次的文件名，它们不可能构成冲突
+    candidates = {filename: files for filename, files in by_name.items() if len(files) > 1}
+    candidate_files = sum(len(files) for files in candidates.values())
+    print(f"[信息] 扫描完成，共处理文件数: {total_files}，其中需要计算 {algorithm_name} 的同名文件数: {candidate_files}")
 
-    # 转换为 DataFrame 方便处理
-    df = pd.DataFrame(file_info)
+    # 第三步：只对候选文件计算哈希（报告中要列出冲突组内每个文件的完整哈希，所以候选文件都需要完整读取一次）。
+    print(f"[信息] 正在计算 {algorithm_name}...")
+    cache = HashCache(root_dir, algorithm) if use_cache else None
+    try:
+        digests = hash_entries([record for files in candidates.values() for record in files],
+                               algorithm, workers, use_processes, cache)
+        if cache is not None:
+            pruned = cache.prune(record.path for files in by_name.values() for record in files)
+            if pruned:
+                print(f"[信息] 已从哈希缓存中清理 {pruned} 个已删除文件的记录")
+    finally:
+        if cache is not None:
+            cache.close()
 
-    # 按文件名分组，查找 MD5 不同的文件
+    # 第四步：按文件名分组查找哈希不同的文件，结果边找边写入报告
     print(f"[信息] 正在分析文件名重复...")
-    conflicts = []
-    grouped = df.groupby("filename")
-    for filename, group in grouped:
-        if len(group["md5"].unique()) > 1:  # 如果同名文件有不同的 MD5 值
-            print(f"[重复] 文件名: {filename}, 重复文件数: {len(group)}")
-            conflicts.append(
-                {"filename": filename, "file_paths": group["file_path"].tolist(), "md5s": group["md5"].tolist()})
-
-    # 保存重复文件名到 Excel
-    if conflicts:
-        print(f"[信息] 检测到 {len(conflicts)} 个文件重复。正在保存到 Excel...")
-        output_data = []
-        for conflict in conflicts:
-            for path, md5 in zip(conflict["file_paths"], conflict["md5s"]):
-                output_data.append({"文件名": conflict["filename"], "文件路径": path, "MD5": md5})
-
-        output_df = pd.DataFrame(output_data)
-        output_df.to_excel(output_file, index=False)
+    conflict_count = 0
+    writer = None
+    try:
+        for filename in sorted(candidates):
+            group = [(record.path, digests.get(file_key(record))) for record in candidates[filename]]
+            group = [(path, digest) for path, digest in group if digest]
+            if len(set(digest for _, digest in group)) > 1:  # 如果同名文件有不同的 MD5 值
+                print(f"[重复] 文件名: {filename}, 重复文件数: {len(group)}")
+                if writer is None:
+                    writer = ReportWriter(output_file, ["文件名", "文件路径", algorithm_name])
+                for path, digest in group:
+                    writer.write_row([filename, path, digest])
+                conflict_count += 1
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if conflict_count:
+        print(f"[信息] 检测到 {conflict_count} 个文件重复，共 {writer.rows} 行。")
         print(f"[成功] 重复文件已导出到: {output_file}")
-        messagebox.showinfo("完成", f"重复文件已导出到: {output_file}")
     else:
         print("[信息] 未发现文件名相同但 MD5 不同的文件。")
-        messagebox.showinfo("完成", "未发现文件名相同但 MD5 不同的文件。")
+    return conflict_count
+
+
+def find_content_duplicates(root_dir, output_file, algorithm="md5", workers=None, use_processes=False,
+                            use_cache=True):
+    """
+    找出内容完全相同的文件（不论文件名），并导出到 Excel 文件（output_file 以 .csv 结尾时导出为 CSV）。
+    依次按 文件大小 -> 首尾块哈希 -> 完整哈希 三级筛选，只有前两级都相同的文件才需要完整读取；
+    已经互为硬链接的文件视为同一份数据，不重复计算也不计入可回收空间。
+    返回重复组列表 [(摘要, 文件大小, [ScanRecord, ...]), ...]，按可回收字节数从大到小排列。
+    """
+    algorithm_name = next(name for name, value in HASH_ALGORITHMS.items() if value == algorithm)
+    print(f"[信息] 正在扫描文件夹: {root_dir}")
+
+    # 第一步：遍历文件夹，按文件大小分组（空文件不参与比较）
+    total_files = 0
+    by_size = {}
+    for record in scan_files(root_dir):
+        total_files += 1
+        if record.size:
+            by_size.setdefault(record.size, []).append(record)
+
+    def split_groups(groups, key_func):
+        """按 key_func 细分每一组，只保留包含两个及以上不同物理文件的组"""
+        result = []
+        for records in groups:
+            sub_groups = {}
+            for record in records:
+                key = key_func(record)
+                if key is not None:
+                    sub_groups.setdefault(key, []).append(record)
+            result.extend(sub for sub in sub_groups.values() if len({file_key(r) for r in sub}) > 1)
+        return result
+
+    # 只有大小相同的文件才需要真实的 st_dev/st_ino，且只在扫描没给出 inode 时（Windows）补读；
+    # 补读时发现已被删除的文件直接跳过
+    size_candidates = []
+    for records in by_size.values():
+        if len(records) < 2:
+            continue
+        refreshed = []
+        for record in records:
+            if not record.inode:
+                try:
+                    record.refresh_identity()
+                except OSError:
+                    continue
+            refreshed.append(record)
+        size_candidates.append(refreshed)
+    groups = split_groups(size_candidates, lambda record: record.size)
+    print(f"[信息] 扫描完成，共处理文件数: {total_files}，"
+          f"大小相同的候选文件数: {sum(len(records) for records in groups)}")
+
+    # 第二步：较大的文件先比较首尾块，小文件的首尾块就是全部内容，直接进入下一步
+    large = [records for records in groups if records[0].size > PARTIAL_BLOCK_SIZE * 2]
+    small = [records for records in groups if records[0].size <= PARTIAL_BLOCK_SIZE * 2]
+    if large:
+        print("[信息] 正在比较首尾块...")
+        partial_jobs = list({file_key(record): record for records in large for record in records}.items())
+        hashed = hash_files([(record.path, PARTIAL_BLOCK_SIZE * 2) for _, record in partial_jobs],
+                            algorithm, workers, use_processes, calculate_partial_hash)
+        partial_digests = {key: digest for (key, _), (_, digest) in zip(partial_jobs, hashed)}
+        large = split_groups(large, lambda record: partial_digests.get(file_key(record)))
+
+    # 第三步：只对前两步仍然相同的文件计算完整哈希
+    candidates = small + large
+    print(f"[信息] 正在计算 {algorithm_name}，候选文件数: {sum(len(records) for records in candidates)}")
+    cache = HashCache(root_dir, algorithm) if use_cache else None
+    try:
+        digests = hash_entries([record for records in candidates for record in records],
+                               algorithm, workers, use_processes, cache)
+    finally:
+        if cache is not None:
+            cache.close()
+    duplicates = [(digests[file_key(records[0])], records[0].size, records)
+                  for records in split_groups(candidates, lambda record: digests.get(file_key(record)))]
+    duplicates.sort(key=lambda group: (-(len({file_key(r) for r in group[2]}) - 1) * group[1], group[0]))
+
+    # 第四步：导出报告，每组的可回收空间 = (不同物理文件数 - 1) * 文件大小
+    if not duplicates:
+        print("[信息] 未发现内容相同的文件。")
+        return duplicates
+    total_reclaimable = 0
+    with ReportWriter(output_file, ["分组", algorithm_name, "文件大小(字节)", "副本数", "可回收字节", "文件路径"]) as writer:
+        for index, (digest, size, records) in enumerate(duplicates, 1):
+            reclaimable = (len({file_key(record) for record in records}) - 1) * size
+            total_reclaimable += reclaimable
+            for record in sorted(records, key=lambda r: r.path):
+                writer.write_row([index, digest, size, len(records), reclaimable, record.path])
+    print(f"[信息] 检测到 {len(duplicates)} 组内容相同的文件，可回收 {total_reclaimable / 1024 / 1024:.1f} MB。")
+    print(f"[成功] 重复文件已导出到: {output_file}")
+    return duplicates
+
+
+def consolidate_hardlinks(duplicates, plan_file, dry_run=True):
+    """
+    把每组重复文件中的其余副本替换为指向保留文件（按路径排序的第一个）的硬链接。
+    替换前逐字节比较内容并确认文件在扫描后未被修改；先在同目录创建临时硬链接，再用 os.replace 原子替换，
+    任何一步失败都不会丢失原文件。不同磁盘之间无法创建硬链接，直接跳过。
+    硬链接共用同一份数据和元数据，替换后的文件修改时间、权限与保留文件相同。
+    dry_run=True 时只生成计划不修改文件。计划 / 执行结果写入 plan_file，返回 (替换文件数, 回收字节数)。
+    """
+    linked = 0
+    reclaimed = 0
+    with ReportWriter(plan_file, ["分组", "保留文件", "替换文件", "文件大小(字节)", "操作"]) as writer:
+        for index, (_, size, records) in enumerate(duplicates, 1):
+            records = sorted(records, key=lambda r: r.path)
+            keep = records[0]
+            keep_key = file_key(keep)
+            counted_keys = set()
+            for record in records[1:]:
+                key = file_key(record)
+                if key == keep_key:
+                    action = "跳过：已是硬链接"
+                elif record.dev != keep.dev:
+                    action = "跳过：不在同一磁盘"
+                elif dry_run:
+                    action = "计划替换为硬链接"
+                else:
+                    action = _replace_with_hardlink(keep, record)
+                    if action == "已替换为硬链接":
+                        linked += 1
+                        if key not in counted_keys:
+                            counted_keys.add(key)
+                            reclaimed += size
+                writer.write_row([index, keep.path, record.path, size, action])
+    if dry_run:
+        print(f"[信息] 硬链接替换计划已导出到: {plan_file}")
+    else:
+        print(f"[成功] 已将 {linked} 个文件替换为硬链接，约回收 {reclaimed / 1024 / 1024:.1f} MB，"
+              f"明细已导出到: {plan_file}")
+    return linked, reclaimed
+
+
+def _replace_with_hardlink(keep, record):
+    """把 record 替换为指向 keep 的硬链接，返回写入计划表的操作说明"""
+    try:
+        for scanned in (keep, record):
+            st = os.stat(scanned.path)
+            if (st.st_size, st.st_mtime_ns) != (scanned.size, scanned.mtime_ns):
+                return "跳过：扫描后文件已被修改"
+        if not filecmp.cmp(keep.path, record.path, shallow=False):
+            return "跳过：逐字节比较不一致"
+    except OSError as e:
+        return f"跳过：{e}"
+    # 临时文件名随机生成，重名时换一个重试；只删除本次创建的临时链接，不会误删用户的同名文件
+    temp_path = None
+    try:
+        while True:
+            candidate = tempfile.mktemp(prefix=record.name + ".", suffix=".hardlink_tmp", dir=record.dirpath)
+            try:
+                os.link(keep.path, candidate)
+            except FileExistsError:
+                continue
+            temp_path = candidate
+            break
+        os.replace(temp_path, record.path)
+    except OSError as e:
+        if temp_path is not None and os.path.lexists(temp_path):
+            os.remove(temp_path)
+        print(f"[错误] 无法替换为硬链接: {record.path}，错误: {e}")
+        return f"失败：{e}"
+    return "已替换为硬链接"
+
+
+def find_similar_images(root_dir, output_file, max_distance=DEFAULT_IMAGE_DISTANCE, workers=None,
+                        use_processes=False, use_cache=True):
+    """
+    找出看起来相同的图片（缩放、重新导出、CMYK 转换后的版本），并导出到 Excel 文件。
+    每张图片计算 dHash（结果保存在哈希缓存中，未修改的图片下次不再解码），
+    用 BK 树查找汉明距离不超过 max_distance 的哈希，再用并查集把相互相似的图片合并成组。
+    返回相似图片组数。
+    """
+    print(f"[信息] 正在扫描文件夹: {root_dir}")
+    images = [record for record in scan_files(root_dir) if record.name.lower().endswith(IMAGE_EXTENSIONS)]
+    print(f"[信息] 扫描完成，共找到图片: {len(images)}")
+
+    # 第一步：计算（或从缓存读取）每张图片的 dHash
+    print("[信息] 正在计算图片感知哈希...")
+    cache = HashCache(root_dir, DHASH_ALGORITHM) if use_cache else None
+    try:
+        digests = hash_entries(images, DHASH_ALGORITHM, workers, use_processes, cache, calculate_dhash)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    # 第二步：相同哈希的图片先归到一起，BK 树中每个哈希值只出现一次
+    by_hash = {}
+    for record in images:
+        digest = digests.get(file_key(record))
+        if digest is not None:
+            by_hash.setdefault(int(digest, 16), []).append(record)
+    tree = BKTree()
+    for value in by_hash:
+        tree.add(value)
+
+    # 第三步：并查集合并相似的哈希值
+    parent = {value: value for value in by_hash}
+
+    def find(value):
+        while parent[value] != value:
+            parent[value] = parent[parent[value]]
+            value = parent[value]
+        return value
+
+    print(f"[信息] 正在查找汉明距离不超过 {max_distance} 的相似图片...")
+    for value in by_hash:
+        for match, _ in tree.search(value, max_distance):
+            root_a, root_b = find(value), find(match)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+    components = {}
+    for value in by_hash:
+        components.setdefault(find(value), []).append(value)
+
+    # 第四步：导出报告，组内按与第一个哈希的距离排序
+    groups = []
+    for values in components.values():
+        records = [record for value in values for record in by_hash[value]]
+        if len({file_key(record) for record in records}) > 1:
+            groups.append(sorted(values))
+    groups.sort(key=lambda values: sorted(by_hash[values[0]], key=lambda r: r.path)[0].path)
+    if not groups:
+        print("[信息] 未发现相似图片。")
+        return 0
+    with ReportWriter(output_file, ["分组", "图片数", "dHash", "与组内首张的汉明距离", "文件路径"]) as writer:
+        for index, values in enumerate(groups, 1):
+            count = sum(len(by_hash[value]) for value in values)
+            rows = [(hamming_distance(value, values[0]), record.path, value)
+                    for value in values for record in by_hash[value]]
+            for distance, path, value in sorted(rows):
+                writer.write_row([index, count, f"{value:016x}", distance, path])
+    print(f"[信息] 检测到 {len(groups)} 组相似图片。")
+    print(f"[成功] 相似图片已导出到: {output_file}")
+    return len(groups)
+
+
+def _tree_digest(algorithm, entries):
+    """目录摘要：对按名称排序的 (名称, 类型, 值) 列表计算哈希，文件名中不可能出现 \\0，用作分隔符"""
+    hasher = hashlib.new(algorithm)
+    for name, kind, value in sorted(entries):
+        hasher.update(f"{name}\0{kind}\0{value}\0".encode("utf-8", "surrogatepass"))
+    return hasher.hexdigest()
+
+
+def find_duplicate_directories(root_dir, output_file, algorithm="md5", workers=None, use_processes=False,
+                               use_cache=True):
+    """
+    找出内容完全相同的文件夹（文件名、子目录结构和文件内容都相同），并导出到 Excel 文件。
+    目录摘要自底向上由子项的 (名称, 摘要) 组合而成（Merkle 树）。
+    先用不读文件内容的“结构摘要”（名称 + 文件大小）筛选，结构唯一的目录及其子树不再处理；
+    只有结构相同的目录下的文件才需要计算哈希。相同的子树只在最高一级报告一次，空目录不参与比较。
+    返回重复文件夹组数。
+    """
+    algorithm_name = next(name for name, value in HASH_ALGORITHMS.items() if value == algorithm)
+    print(f"[信息] 正在扫描文件夹: {root_dir}")
+
+    # 第一步：遍历文件夹，记录每个目录的文件和子目录（先序，父目录在子目录之前）
+    dirs = []
+    files_in = {}
+    subdirs_in = {}
+    total_files = 0
+    for dirpath, dirnames, filenames in walk(root_dir, with_stat=True):
+        dirs.append(dirpath)
+        files_in[dirpath] = [ScanRecord(dirpath, filename, st) for filename, st in filenames]
+        subdirs_in[dirpath] = dirnames
+        total_files += len(filenames)
+    print(f"[信息] 扫描完成，共处理目录数: {len(dirs)}，文件数: {total_files}")
+
+    # 第二步：自底向上计算结构摘要；含有无法进入的子目录（符号链接、无权限）的目录不参与比较
+    shape = {}
+    file_count = {}
+    total_size = {}
+    for dirpath in reversed(dirs):
+        entries = [(record.name, "f", record.size) for record in files_in[dirpath]]
+        count = len(entries)
+        size = sum(record.size for record in files_in[dirpath])
+        comparable = True
+        for name in subdirs_in[dirpath]:
+            child = os.path.join(dirpath, name)
+            if shape.get(child) is None:
+                comparable = False
+                break
+            entries.append((name, "d", shape[child]))
+            count += file_count[child]
+            size += total_size[child]
+        shape[dirpath] = _tree_digest(algorithm, entries) if comparable else None
+        file_count[dirpath] = count
+        total_size[dirpath] = size
+    by_shape = {}
+    for dirpath in dirs:
+        if shape[dirpath] is not None and file_count[dirpath]:
+            by_shape.setdefault(shape[dirpath], []).append(dirpath)
+    # 结构相同的目录，其子目录的结构也必然相同，因此候选集合对子树是封闭的
+    candidates = {dirpath for group in by_shape.values() if len(group) > 1 for dirpath in group}
+    print(f"[信息] 结构相同的候选目录数: {len(candidates)}")
+
+    # 第三步：只对候选目录下的文件计算哈希
+    print(f"[信息] 正在计算 {algorithm_name}...")
+    cache = HashCache(root_dir, algorithm) if use_cache else None
+    try:
+        digests = hash_entries([record for dirpath in candidates for record in files_in[dirpath]],
+                               algorithm, workers, use_processes, cache)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    # 第四步：自底向上计算候选目录的内容摘要，读取失败的文件所在目录不参与比较。
+    # 空目录（子树中没有文件）本身不报告，但作为候选目录的子目录时也要参与摘要计算
+    merkle = {}
+    for dirpath in reversed(dirs):
+        if dirpath not in candidates and not (file_count[dirpath] == 0 and shape[dirpath] is not None):
+            continue
+        entries = []
+        for record in files_in[dirpath]:
+            digest = digests.get(file_key(record))
+            if digest is None:
+                break
+            entries.append((record.name, "f", digest))
+        else:
+            for name in subdirs_in[dirpath]:
+                child = merkle.get(os.path.join(dirpath, name))
+                if child is None:
+                    break
+                entries.append((name, "d", child))
+            else:
+                merkle[dirpath] = _tree_digest(algorithm, entries)
+    by_digest = {}
+    for dirpath in dirs:
+        if dirpath in merkle and file_count[dirpath]:
+            by_digest.setdefault(merkle[dirpath], []).append(dirpath)
+    duplicated = {dirpath for group in by_digest.values() if len(group) > 1 for dirpath in group}
+
+    # 第五步：只报告最高一级：组内所有目录的上级目录也都重复时，该组已包含在上级目录的组中
+    groups = [group for group in by_digest.values()
+              if len(group) > 1 and any(dirpath == root_dir or os.path.dirname(dirpath) not in duplicated
+                                        for dirpath in group)]
+    groups.sort(key=lambda group: (-(len(group) - 1) * total_size[group[0]], group[0]))
+    if not groups:
+        print("[信息] 未发现内容相同的文件夹。")
+        return 0
+    with ReportWriter(output_file, ["分组", algorithm_name, "文件数", "文件夹大小(字节)", "可回收字节", "文件夹路径"]) as writer:
+        for index, group in enumerate(groups, 1):
+            size = total_size[group[0]]
+            for dirpath in group:
+                writer.write_row([index, merkle[dirpath], file_count[dirpath], size, (len(group) - 1) * size, dirpath])
+    print(f"[信息] 检测到 {len(groups)} 组内容相同的文件夹。")
+    print(f"[成功] 重复文件夹已导出到: {output_file}")
+    return len(groups)
+
+
+def scan_to_manifest(root_dir, manifest_file, algorithm="md5", workers=None, use_processes=False,
+                     use_cache=True, relative_to=None):
+    """
+    扫描 root_dir 下的全部文件并计算哈希，写入可移植的扫描清单（gzip 压缩的 JSON Lines）。
+    第一行为文件头（格式、算法、主机名、根目录），之后每行一个文件：[相对路径, 文件名, 大小, mtime_ns, 摘要]。
+    相对路径相对于 relative_to（默认 root_dir），统一使用 / 分隔；大目录可以按子目录拆分给多个进程或多台机器扫描，
+    只要 relative_to 指向同一个上级目录，合并后的路径就与整体扫描一致。返回写入的文件数。
+    """
+    relative_to = relative_to or root_dir
+    print(f"[信息] 正在扫描文件夹: {root_dir}")
+    records = list(scan_files(root_dir))
+    print(f"[信息] 扫描完成，共处理文件数: {len(records)}，正在计算哈希...")
+    cache = HashCache(root_dir, algorithm) if use_cache else None
+    try:
+        digests = hash_entries(records, algorithm, workers, use_processes, cache)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    header = {"format": MANIFEST_FORMAT, "version": MANIFEST_VERSION, "algorithm": algorithm,
+              "host": socket.gethostname(), "root": os.path.abspath(relative_to),
+              "created": datetime.now().isoformat(timespec="seconds")}
+    count = 0
+    temp_file = manifest_file + ".tmp"
+    with gzip.open(temp_file, "wt", encoding="utf-8") as f:
+        f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        for record in records:
+            digest = digests.get(file_key(record))
+            if digest is None:
+                continue
+            relpath = os.path.relpath(record.path, relative_to).replace(os.sep, "/")
+            f.write(json.dumps([relpath, record.name, record.size, record.mtime_ns, digest],
+                               ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(temp_file, manifest_file)
+    print(f"[成功] 扫描清单已写入: {manifest_file}，共 {count} 个文件")
+    return count
+
+
+def read_manifest(manifest_file):
+    """读取扫描清单，返回 (文件头, 行迭代器)，行为 [相对路径, 文件名, 大小, mtime_ns, 摘要]"""
+    f = gzip.open(manifest_file, "rt", encoding="utf-8")
+    header = json.loads(f.readline())
+    if header.get("format") != MANIFEST_FORMAT or header.get("version") != MANIFEST_VERSION:
+        f.close()
+        raise ValueError(f"不是有效的扫描清单文件: {manifest_file}")
+
+    def rows():
+        with f:
+            for line in f:
+                yield json.loads(line)
+    return header, rows()
+
+
+def merge_manifests(manifest_files, output_dir=".", extension=".xlsx"):
+    """
+    合并多个扫描清单，按与本地扫描相同的规则导出“同名但内容不同”和“内容相同”两份报告，全程不读取文件内容。
+    所有清单必须使用相同的哈希算法。来源列为 主机名:根目录，便于区分不同服务器上的相同相对路径。
+    返回 (冲突文件名数量, 内容重复组数)。
+    """
+    algorithm = None
+    by_name = {}
+    by_content = {}
+    seen = set()  # 重叠的分片清单中同一个文件只计一次
+    total_files = 0
+    for manifest_file in manifest_files:
+        header, rows = read_manifest(manifest_file)
+        if algorithm is None:
+            algorithm = header["algorithm"]
+        elif header["algorithm"] != algorithm:
+            raise ValueError(f"扫描清单的哈希算法不一致: {manifest_file} 使用 {header['algorithm']}，其他清单使用 {algorithm}")
+        source = f"{header['host']}:{header['root']}"
+        print(f"[信息] 正在读取扫描清单: {manifest_file}（{source}）")
+        for relpath, name, size, _, digest in rows:
+            if (source, relpath) in seen:
+                continue
+            seen.add((source, relpath))
+            total_files += 1
+            entry = (source, relpath, digest)
+            by_name.setdefault(name, []).append(entry)
+            if size:
+                by_content.setdefault((size, digest), []).append(entry)
+    if algorithm is None:
+        raise ValueError("没有提供扫描清单")
+    algorithm_name = next((name for name, value in HASH_ALGORITHMS.items() if value == algorithm), algorithm)
+    print(f"[信息] 共读取 {len(manifest_files)} 个清单，{total_files} 个文件")
+
+    # 同名但内容不同
+    conflict_count = 0
+    conflict_file = os.path.join(output_dir, "重复文件查找结果" + extension)
+    writer = None
+    try:
+        for name in sorted(by_name):
+            entries = by_name[name]
+            if len(entries) > 1 and len({digest for _, _, digest in entries}) > 1:
+                if writer is None:
+                    writer = ReportWriter(conflict_file, ["文件名", "来源", "文件路径", algorithm_name])
+                for source, relpath, digest in entries:
+                    writer.write_row([name, source, relpath, digest])
+                conflict_count += 1
+    finally:
+        if writer is not None:
+            writer.close()
+    if conflict_count:
+        print(f"[成功] 检测到 {conflict_count} 个文件名冲突，已导出到: {conflict_file}")
+
+    # 内容相同（不论文件名）
+    groups = [(size, digest, entries) for (size, digest), entries in by_content.items() if len(entries) > 1]
+    groups.sort(key=lambda group: (-(len(group[2]) - 1) * group[0], group[1]))
+    if groups:
+        duplicate_file = os.path.join(output_dir, "内容重复文件查找结果" + extension)
+        with ReportWriter(duplicate_file, ["分组", algorithm_name, "文件大小(字节)", "副本数", "可回收字节", "来源", "文件路径"]) as writer:
+            for index, (size, digest, entries) in enumerate(groups, 1):
+                for source, relpath, _ in sorted(entries):
+                    writer.write_row([index, digest, size, len(entries), (len(entries) - 1) * size, source, relpath])
+        print(f"[成功] 检测到 {len(groups)} 组内容相同的文件，已导出到: {duplicate_file}")
+    return conflict_count, len(groups)
+
+
+def main(argv=None):
+    """命令行入口：scan 生成扫描清单，merge 合并多个清单并导出报告"""
+    parser = argparse.ArgumentParser(description="重复文件查找工具（无界面版）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    scan_parser = subparsers.add_parser("scan", help="扫描文件夹并生成扫描清单")
+    scan_parser.add_argument("root_dir", help="要扫描的文件夹")
+    scan_parser.add_argument("manifest", help="输出的扫描清单文件（如 server1.jsonl.gz）")
+    scan_parser.add_argument("--algorithm", choices=sorted(HASH_ALGORITHMS.values()), default="md5", help="哈希算法")
+    scan_parser.add_argument("--workers", type=int, default=None, help="哈希并发数，默认按磁盘类型自动选择")
+    scan_parser.add_argument("--processes", action="store_true", help="使用多进程计算哈希")
+    scan_parser.add_argument("--no-cache", action="store_true", help="不使用本地哈希缓存")
+    scan_parser.add_argument("--relative-to", default=None, help="清单中相对路径的基准目录，默认为扫描的文件夹")
+    merge_parser = subparsers.add_parser("merge", help="合并扫描清单并导出重复文件报告")
+    merge_parser.add_argument("manifests", nargs="+", help="扫描清单文件")
+    merge_parser.add_argument("--output-dir", default=".", help="报告输出目录")
+    merge_parser.add_argument("--csv", action="store_true", help="导出为 CSV")
+    args = parser.parse_args(argv)
+
+    if args.command == "scan":
+        scan_to_manifest(args.root_dir, args.manifest, args.algorithm, args.workers, args.processes,
+                         not args.no_cache, args.relative_to)
+    else:
+        merge_manifests(args.manifests, args.output_dir, ".csv" if args.csv else ".xlsx")
+    return 0
 
 
 def start_scan():
@@ -99,8 +1038,69 @@ def start_scan():
         messagebox.showerror("错误", "输入的文件夹路径不存在或无法访问，请检查后重试。")
         return
 
-    output_file = "重复文件查找结果.xlsx"
-    find_version_conflicts(root_dir, output_file)
+    try:
+        workers = int(workers_var.get()) if workers_var.get().strip() else None
+    except ValueError:
+        messagebox.showerror("错误", "并发数必须是整数，留空表示自动选择。")
+        return
+
+    extension = ".csv" if export_csv_var.get() else ".xlsx"
+    algorithm = HASH_ALGORITHMS[algorithm_var.get()]
+    if mode_var.get() == "content":
+        output_file = "内容重复文件查找结果" + extension
+        duplicates = find_content_duplicates(root_dir, output_file, algorithm, workers,
+                                             use_processes_var.get(), use_cache_var.get())
+        if not duplicates:
+            messagebox.showinfo("完成", "未发现内容相同的文件。")
+            return
+        if not hardlink_var.get():
+            messagebox.showinfo("完成", f"重复文件已导出到: {output_file}")
+            return
+        plan_file = "硬链接替换计划" + extension
+        dry_run = dry_run_var.get()
+        if not dry_run and not messagebox.askyesno(
+                "确认", "将把重复副本替换为硬链接（替换前会逐字节比较），此操作会修改文件，是否继续？"):
+            return
+        linked, reclaimed = consolidate_hardlinks(duplicates, plan_file, dry_run)
+        if dry_run:
+            messagebox.showinfo("完成", f"重复文件已导出到: {output_file}\n硬链接替换计划已导出到: {plan_file}")
+        else:
+            messagebox.showinfo("完成", f"已将 {linked} 个文件替换为硬链接，约回收 {reclaimed / 1024 / 1024:.1f} MB。\n"
+                                      f"明细已导出到: {plan_file}")
+        return
+
+    if mode_var.get() == "image":
+        try:
+            max_distance = int(distance_var.get())
+        except ValueError:
+            messagebox.showerror("错误", "汉明距离阈值必须是整数。")
+            return
+        output_file = "相似图片查找结果" + extension
+        group_count = find_similar_images(root_dir, output_file, max_distance, workers,
+                                          use_processes_var.get(), use_cache_var.get())
+        if group_count:
+            messagebox.showinfo("完成", f"相似图片已导出到: {output_file}")
+        else:
+            messagebox.showinfo("完成", "未发现相似图片。")
+        return
+
+    if mode_var.get() == "directory":
+        output_file = "重复文件夹查找结果" + extension
+        group_count = find_duplicate_directories(root_dir, output_file, algorithm, workers,
+                                                 use_processes_var.get(), use_cache_var.get())
+        if group_count:
+            messagebox.showinfo("完成", f"重复文件夹已导出到: {output_file}")
+        else:
+            messagebox.showinfo("完成", "未发现内容相同的文件夹。")
+        return
+
+    output_file = "重复文件查找结果" + extension
+    conflict_count = find_version_conflicts(root_dir, output_file, algorithm, workers,
+                                            use_processes_var.get(), use_cache_var.get())
+    if conflict_count:
+        messagebox.showinfo("完成", f"重复文件已导出到: {output_file}")
+    else:
+        messagebox.showinfo("完成", "未发现文件名相同但 MD5 不同的文件。")
 
 
 def browse_folder():
@@ -112,13 +1112,20 @@ def browse_folder():
 
 
 if __name__ == "__main__":
+    # 打包成 exe 后使用进程池需要
+    multiprocessing.freeze_support()
+
+    # 带参数运行时使用命令行模式（scan / merge），否则启动界面
+    if len(sys.argv) > 1:
+        sys.exit(main())
+
     # 检查使用期限
     check_usage_expiry()
 
     # 创建主窗口
     app = tk.Tk()
     app.title("重复文件查找工具")
-    app.geometry("500x200")
+    app.geometry("600x450")
 
     # 文件夹选择
     folder_path = tk.StringVar()
@@ -126,6 +1133,46 @@ if __name__ == "__main__":
     tk.Entry(app, textvariable=folder_path, width=50).pack(pady=5)
     tk.Button(app, text="浏览", command=browse_folder).pack(pady=5)
 
+    # 查找模式
+    mode_var = tk.StringVar(value="name")
+    mode_frame = tk.Frame(app)
+    mode_frame.pack(pady=5)
+    tk.Radiobutton(mode_frame, text="同名但内容不同", variable=mode_var, value="name").pack(side="left")
+    tk.Radiobutton(mode_frame, text="内容相同（不论文件名）", variable=mode_var, value="content").pack(side="left")
+    tk.Radiobutton(mode_frame, text="相同文件夹", variable=mode_var, value="directory").pack(side="left")
+    tk.Radiobutton(mode_frame, text="相似图片", variable=mode_var, value="image").pack(side="left")
+
+    # 哈希选项
+    options_frame = tk.Frame(app)
+    options_frame.pack(pady=5)
+    tk.Label(options_frame, text="哈希算法:").pack(side="left")
+    algorithm_var = tk.StringVar(value="MD5")
+    tk.OptionMenu(options_frame, algorithm_var, *HASH_ALGORITHMS).pack(side="left", padx=5)
+    tk.Label(options_frame, text="并发数(留空自动):").pack(side="left")
+    workers_var = tk.StringVar()
+    tk.Entry(options_frame, textvariable=workers_var, width=5).pack(side="left", padx=5)
+    use_processes_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(options_frame, text="使用多进程", variable=use_processes_var).pack(side="left")
+    use_cache_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(app, text="使用哈希缓存（只重新计算新增或修改过的文件）", variable=use_cache_var).pack()
+    export_csv_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(app, text="导出为 CSV（结果很多时更快）", variable=export_csv_var).pack()
+
+    # 硬链接替换选项（仅内容相同模式）
+    hardlink_frame = tk.Frame(app)
+    hardlink_frame.pack()
+    hardlink_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(hardlink_frame, text="用硬链接替换重复副本", variable=hardlink_var).pack(side="left")
+    dry_run_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(hardlink_frame, text="仅生成计划（不修改文件）", variable=dry_run_var).pack(side="left")
+
+    # 相似图片选项
+    image_frame = tk.Frame(app)
+    image_frame.pack()
+    tk.Label(image_frame, text="相似图片汉明距离阈值(0-64):").pack(side="left")
+    distance_var = tk.StringVar(value=str(DEFAULT_IMAGE_DISTANCE))
+    tk.Entry(image_frame, textvariable=distance_var, width=5).pack(side="left", padx=5)
+
     # 开始按钮
     tk.Button(app, text="开始扫描", command=start_scan, bg="green", fg="white").pack(pady=20)
 
@@ -0,0 +1,478 @@
+import os
+import re
+import copy
+import math
+import numbers
+import shutil
+import struct
+import zipfile
+import datetime
+import posixpath
+import tempfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.cell import column_index_from_string, get_column_letter, range_boundaries
+from openpyxl.utils.datetime import from_excel, to_excel
+from openpyxl.utils.escape import unescape
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+M = "{%s}" % NS_MAIN
+
+# 与 openpyxl 给日期时间单元格设置的数字格式保持一致
+DATE_FORMATS = {
+    datetime.datetime: "yyyy-mm-dd h:mm:ss",
+    datetime.date: "yyyy-mm-dd",
+    datetime.time: "h:mm:ss",
+    datetime.timedelta: "[hh]:mm:ss",
+}
+FIRST_CUSTOM_FORMAT_ID = 164  # 自定义数字格式的编号从 164 开始
+FULL_CALC_ON_LOAD = b'<calcPr calcId="124519" fullCalcOnLoad="1"/>'
+
+ROW_RE = re.compile(rb'<row\b([^>]*?)(?:/>|>(.*?)</row>)', re.S)
+CELL_RE = re.compile(rb'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+ATTR_RE = re.compile(rb'([\w:]+)="([^"]*)"')
+REF_RE = re.compile(rb'\sr="(([A-Z]+)\d+)"')
+ROW_NUMBER_RE = re.compile(rb'\sr="(\d+)"')
+MISSING_REF_RE = re.compile(rb'<(?:row|c)\b(?![^>]*?\sr=")')
+XF_RE = re.compile(rb'<xf\b[^>]*?(?:/>|>.*?</xf>)', re.S)
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+
+
+class UnsupportedWorkbook(ValueError):
+    """工作簿包含本模块不处理的结构（公式单元格、1904 日期系统等），调用方应改用 openpyxl 整体读写"""
+
+
+def _resolve(base, target):
+    """把关系文件中的 Target 转换为 zip 内的成员名"""
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
+
+
+def _rels_name(part):
+    return posixpath.join(posixpath.dirname(part), "_rels", posixpath.basename(part) + ".rels")
+
+
+def _read_rels(zf, part):
+    """返回 {关系 Id: (类型, 成员名)}"""
+    try:
+        rels = ET.fromstring(zf.read(_rels_name(part)))
+    except KeyError:
+        return {}
+    return {rel.get("Id"): (rel.get("Type", ""), _resolve(part, rel.get("Target", "")))
+            for rel in rels.iter("{%s}Relationship" % NS_PKG_REL)
+            if rel.get("TargetMode") != "External"}
+
+
+def _attrs(raw):
+    return dict(ATTR_RE.findall(raw))
+
+
+def _format_attrs(attrs):
+    return b"".join(b' %s="%s"' % item for item in attrs.items())
+
+
+def _copy_raw(zin, zout, info):
+    """不解压、不重新压缩，把 zin 中的一个成员原样复制到 zout"""
+    zin.fp.seek(info.header_offset)
+    header = LOCAL_HEADER.unpack(zin.fp.read(LOCAL_HEADER.size))
+    zin.fp.seek(info.header_offset + LOCAL_HEADER.size + header[10] + header[11])
+    new_info = copy.copy(info)
+    new_info.flag_bits &= ~0x08  # 大小已经写在本地文件头里，不再需要数据描述符
+    new_info.header_offset = zout.fp.tell()
+    zout.fp.write(new_info.FileHeader(False))
+    remaining = info.compress_size
+    while remaining:
+        chunk = zin.fp.read(min(remaining, 1 << 20))
+        if not chunk:
+            raise zipfile.BadZipFile(f"{info.filename} 数据不完整")
+        zout.fp.write(chunk)
+        remaining -= len(chunk)
+    zout.filelist.append(new_info)
+    zout.NameToInfo[new_info.filename] = new_info
+    zout.start_dir = zout.fp.tell()
+    zout._didModify = True
+
+
+class SheetPatcher:
+    """
+    只读写 xlsx 中活动工作表 XML 的轻量写入器。
+    read_column 流式读取活动表的一列；save 只重写活动表中被修改的行，其余 zip 成员原样复制，
+    需要日期格式时在 styles.xml 末尾追加样式。遇到无法安全处理的情况抛出 UnsupportedWorkbook。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with zipfile.ZipFile(path) as zf:
+            package_rels = _read_rels(zf, "")
+            self.workbook_part = next((name for rel_type, name in package_rels.values()
+                                       if rel_type.endswith("/officeDocument")), "xl/workbook.xml")
+            workbook = ET.fromstring(zf.read(self.workbook_part))
+            if workbook.tag != M + "workbook":
+                raise UnsupportedWorkbook("不支持的工作簿格式（如 Strict Open XML）")
+            workbook_pr = workbook.find(M + "workbookPr")
+            if workbook_pr is not None and workbook_pr.get("date1904") in ("1", "true"):
+                raise UnsupportedWorkbook("工作簿使用 1904 日期系统")
+
+            # 与 openpyxl 的 workbook.active 一致：取 workbookView 的 activeTab，默认第一个工作表
+            view = workbook.find(f"{M}bookViews/{M}workbookView")
+            active = int(view.get("activeTab", 0)) if view is not None else 0
+            sheets = workbook.findall(f"{M}sheets/{M}sheet")
+            if not 0 <= active < len(sheets):
+                raise UnsupportedWorkbook("找不到活动工作表")
+            workbook_rels = _read_rels(zf, self.workbook_part)
+            rel_type, self.sheet_part = workbook_rels.get(sheets[active].get("{%s}id" % NS_REL), ("", None))
+            if not rel_type.endswith("/worksheet"):
+                raise UnsupportedWorkbook("活动工作表不是普通工作表")
+            self.styles_part = next((name for rel_type, name in workbook_rels.values()
+                                     if rel_type.endswith("/styles")), None)
+            self.shared_strings_part = next((name for rel_type, name in workbook_rels.values()
+                                             if rel_type.endswith("/sharedStrings")), None)
+
+            # 单元格样式 -> 数字格式代码，用来识别日期单元格
+            self.formats = {}
+            self.xf_formats = []
+            if self.styles_part:
+                styles = ET.fromstring(zf.read(self.styles_part))
+                self.formats = {int(fmt.get("numFmtId")): fmt.get("formatCode", "")
+                                for fmt in styles.iter(M + "numFmt")}
+                cell_xfs = styles.find(M + "cellXfs")
+                if cell_xfs is not None:
+                    self.xf_formats = [int(xf.get("numFmtId", 0)) for xf in cell_xfs.findall(M + "xf")]
+
+    def _format_code(self, style):
+        if not 0 <= style < len(self.xf_formats):
+            return "General"
+        fmt_id = self.xf_formats[style]
+        return self.formats.get(fmt_id) or BUILTIN_FORMATS.get(fmt_id, "General")
+
+    def _shared_strings(self, zf):
+        strings = []
+        if not self.shared_strings_part:
+            return strings
+        for _, elem in ET.iterparse(zf.open(self.shared_strings_part)):
+            if elem.tag == M + "si":
+                # 富文本拼接各段文字，注音（rPh）不算在内，与 openpyxl 相同
+                parts = [t.text or "" for t in elem.findall(M + "t")]
+                parts += [t.text or "" for t in elem.findall(f"{M}r/{M}t")]
+                strings.append(unescape("".join(parts)))
+                elem.clear()
+        return strings
+
+    def _cell_value(self, cell, strings):
+        data_type = cell.get("t", "n")
+        if data_type == "inlineStr":
+            node = cell.find(M + "is")
+            if node is None:
+                return None
+            parts = [t.text or "" for t in node.findall(M + "t")]
+            parts += [t.text or "" for t in node.findall(f"{M}r/{M}t")]
+            return unescape("".join(parts))
+        text = cell.findtext(M + "v")
+        if not text:
+            # 公式单元格可能只有空的缓存值（openpyxl 保存的公式即是如此），与 pandas 一样视为空值
+            return None
+        if data_type == "s":
+            return strings[int(text)]
+        if data_type == "b":
+            return bool(int(text))
+        if data_type in ("str", "d"):
+            return text
+        if data_type == "e":
+            return None
+        value = float(text) if any(ch in text for ch in ".eE") else int(text)
+        if is_date_format(self._format_code(int(cell.get("s", 0)))):
+            return from_excel(value)
+        return value
+
+    def read_column(self, column, first_row=1):
+        """
+        读取活动表第 column 列（从 1 开始）从 first_row 起的值，返回列表，下标 0 对应 first_row，空单元格为 None。
+        公式单元格取缓存的计算结果，与 pandas.read_excel 一致。
+        """
+        return self.read_columns([column], first_row)[0]
+
+    def read_columns(self, columns, first_row=1):
+        """一次扫描读取多列，按 columns 的顺序返回各列的值列表（长度相同），规则同 read_column"""
+        letters = {get_column_letter(column).encode(): i for i, column in enumerate(columns)}
+        values = [[] for _ in columns]
+        # 只用正则找出目标列的单元格，不必为整张表的每个单元格建立 XML 元素
+        cell_re = re.compile(rb'<c\b([^>]*?\sr="(%s)(\d+)"[^>]*?)(?:/>|>(.*?)</c>)' % b"|".join(letters), re.S)
+        with zipfile.ZipFile(self.path) as zf:
+            strings = self._shared_strings(zf)
+            data = zf.read(self.sheet_part)
+        # 正则只认识不带前缀、带 r 属性的 <row>/<c>，其他写法交给 openpyxl，避免读出空列
+        start = data.find(b"<sheetData")
+        if start < 0:
+            raise UnsupportedWorkbook("无法识别工作表 XML（可能带有命名空间前缀）")
+        end = data.find(b"</sheetData>", start)
+        end = len(data) if end < 0 else end
+        if MISSING_REF_RE.search(data, start, end):
+            raise UnsupportedWorkbook("行或单元格缺少 r 属性")
+        for match in cell_re.finditer(data, start, end):
+            row_idx = int(match.group(3))
+            if row_idx < first_row:
+                continue
+            cell = ET.fromstring(b'<c xmlns="%s">%s</c>' % (NS_MAIN.encode(), match.group(4) or b""))
+            cell.attrib.update((key.decode(), val.decode()) for key, val in ATTR_RE.findall(match.group(1)))
+            column_values = values[letters[match.group(2)]]
+            column_values.extend([None] * (row_idx - first_row + 1 - len(column_values)))
+            column_values[row_idx - first_row] = self._cell_value(cell, strings)
+        length = max(map(len, values))
+        for column_values in values:
+            column_values.extend([None] * (length - len(column_values)))
+        return values
+
+    def _cell_xml(self, ref, attrs, value, date_style):
+        """生成一个单元格的 XML；attrs 为保留下来的原有属性（样式等）"""
+        attrs = {key: val for key, val in attrs.items() if key not in (b"r", b"t", b"cm", b"vm")}
+        head = {b"r": ref}
+        if value is None or (not isinstance(value, str) and value != value):
+            # 空值（包括 NaN、NaT）只保留样式
+            return b"<c%s/>" % _format_attrs({**head, **attrs})
+        if isinstance(value, bool):
+            return b"<c%s%s><v>%d</v></c>" % (_format_attrs(head), _format_attrs({**attrs, b"t": b"b"}), value)
+        if isinstance(value, tuple(DATE_FORMATS)):
+            attrs[b"s"] = b"%d" % date_style(int(attrs.get(b"s", 0)), DATE_FORMATS[next(
+                cls for cls in DATE_FORMATS if isinstance(value, cls))])
+            return b"<c%s%s><v>%s</v></c>" % (_format_attrs(head), _format_attrs(attrs), repr(to_excel(value)).encode())
+        if isinstance(value, numbers.Number):
+            if isinstance(value, numbers.Integral):
+                text = b"%d" % int(value)
+            else:
+                number = float(value)
+                if math.isinf(number):
+                    raise UnsupportedWorkbook(f"无法写入无穷大: {ref.decode()}")
+                text = repr(number).encode()
+            return b"<c%s%s><v>%s</v></c>" % (_format_attrs(head), _format_attrs(attrs), text)
+        if isinstance(value, str):
+            if ILLEGAL_CHARACTERS_RE.search(value):
+                raise UnsupportedWorkbook(f"文本包含非法字符: {ref.decode()}")
+            if len(value) > 1 and value.startswith("="):
+                # 与 openpyxl 相同，以 = 开头的文本按公式写入
+                return b"<c%s%s><f>%s</f><v></v></c>" % (_format_attrs(head), _format_attrs(attrs),
+                                                       escape(value[1:]).encode("utf-8"))
+            space = b' xml:space="preserve"' if value != value.strip() else b""
+            return b"<c%s%s><is><t%s>%s</t></is></c>" % (_format_attrs(head), _format_attrs({**attrs, b"t": b"inlineStr"}),
+                                                       space, escape(value).encode("utf-8"))
+        raise UnsupportedWorkbook(f"无法写入 {type(value).__name__} 类型的值: {ref.decode()}")
+
+    def _patch_row(self, row_idx, row_attrs, body, updates, date_style):
+        """把 updates {列号: 值} 合并进一行，返回新的 <row> XML"""
+        order = sorted(updates)
+        next_index = 0
+        parts = []
+        position = 0
+
+        def new_cells(before=None):
+            # 原来不存在的单元格按列号顺序插入
+            nonlocal next_index
+            while next_index < len(order) and (before is None or order[next_index] < before):
+                col = order[next_index]
+                next_index += 1
+                ref = b"%s%d" % (get_column_letter(col).encode(), row_idx)
+                parts.append(self._cell_xml(ref, {}, updates[col], date_style))
+
+        for match in CELL_RE.finditer(body):
+            if body[position:match.start()].strip():
+                raise UnsupportedWorkbook(f"第 {row_idx} 行包含无法识别的内容")
+            position = match.end()
+            ref = REF_RE.search(match.group(1))
+            if ref is None:
+                raise UnsupportedWorkbook(f"第 {row_idx} 行的单元格缺少 r 属性")
+            col = column_index_from_string(ref.group(2).decode())
+            new_cells(col)
+            if next_index < len(order) and order[next_index] == col:
+                next_index += 1
+                if match.group(2) and b"<f" in match.group(2):
+                    raise UnsupportedWorkbook(f"单元格 {ref.group(1).decode()} 是公式，不能直接覆盖")
+                parts.append(self._cell_xml(ref.group(1), _attrs(match.group(1)), updates[col], date_style))
+            else:
+                parts.append(match.group(0))
+        if body[position:].strip():
+            raise UnsupportedWorkbook(f"第 {row_idx} 行包含无法识别的内容")
+        new_cells()
+        row_attrs = {key: val for key, val in row_attrs.items() if key != b"spans"}  # spans 只是提示，列范围可能变化
+        return b"<row%s>%s</row>" % (_format_attrs(row_attrs), b"".join(parts))
+
+    def _patch_sheet(self, data, rows, date_style):
+        start = data.find(b"<sheetData")
+        if start < 0:
+            raise UnsupportedWorkbook("无法识别工作表 XML（可能带有命名空间前缀）")
+        open_end = data.index(b">", start) + 1
+        if data[open_end - 2:open_end] == b"/>":
+            body_start = body_end = open_end
+            head, tail = data[:start] + b"<sheetData>", b"</sheetData>" + data[open_end:]
+        else:
+            body_start, body_end = open_end, data.index(b"</sheetData>", open_end)
+            head, tail = data[:body_start], data[body_end:]
+
+        order = sorted(rows)
+        next_index = 0
+        parts = []
+        position = body_start
+
+        def new_rows(before=None):
+            # 原表中不存在的行按行号顺序插入
+            nonlocal next_index
+            while next_index < len(order) and (before is None or order[next_index] < before):
+                row_idx = order[next_index]
+                next_index += 1
+                parts.append(self._patch_row(row_idx, {b"r": b"%d" % row_idx}, b"", rows[row_idx], date_style))
+
+        for match in ROW_RE.finditer(data, body_start, body_end):
+            if next_index == len(order):
+                break
+            number = ROW_NUMBER_RE.search(match.group(1))
+            if number is None:
+                raise UnsupportedWorkbook("行缺少 r 属性")
+            row_idx = int(number.group(1))
+            if order[next_index] > row_idx:
+                continue
+            parts.append(data[position:match.start()])
+            new_rows(row_idx)
+            if next_index < len(order) and order[next_index] == row_idx:
+                next_index += 1
+                parts.append(self._patch_row(row_idx, _attrs(match.group(1)), match.group(2) or b"", rows[row_idx], date_style))
+            else:
+                parts.append(match.group(0))
+            position = match.end()
+        parts.append(data[position:body_end])
+        new_rows()
+        head = self._extend_dimension(head, rows)
+        return head + b"".join(parts) + tail
+
+    @staticmethod
+    def _extend_dimension(head, rows):
+        match = re.search(rb'<dimension ref="([^"]*)"', head)
+        if not match:
+            return head
+        try:
+            min_col, min_row, max_col, max_row = range_boundaries(match.group(1).decode())
+        except ValueError:
+            return head
+        columns = [col for updates in rows.values() for col in updates]
+        min_col, max_col = min([min_col or 1] + columns), max([max_col or 1] + columns)
+        min_row, max_row = min([min_row or 1] + list(rows)), max([max_row or 1] + list(rows))
+        ref = f"{get_column_letter(min_col)}{min_row}:{get_column_letter(max_col)}{max_row}".encode()
+        return head[:match.start(1)] + ref + head[match.end(1):]
+
+    def _styles_patcher(self, data):
+        """返回 (date_style, finish)：date_style 为单元格找到或追加一个日期格式样式，finish 生成新的 styles.xml"""
+        added_formats = {}
+        added_xfs = {}
+        xfs = []
+        if data is not None:
+            cell_xfs = re.search(rb'<cellXfs\b[^>]*>(.*?)</cellXfs>', data, re.S)
+            if cell_xfs:
+                xfs = XF_RE.findall(cell_xfs.group(1))
+        if len(xfs) != len(self.xf_formats):
+            xfs = None
+
+        def date_style(style, fmt):
+            if is_date_format(self._format_code(style)):
+                return style
+            if (style, fmt) in added_xfs:
+                return added_xfs[(style, fmt)]
+            if xfs is None or not 0 <= style < len(xfs):
+                raise UnsupportedWorkbook("无法识别 styles.xml 中的单元格样式")
+            fmt_id = next((i for i, code in BUILTIN_FORMATS.items() if code == fmt), None)
+            if fmt_id is None:
+                fmt_id = next((i for i, code in self.formats.items() if code == fmt), None)
+            if fmt_id is None:
+                fmt_id = added_formats.get(fmt)
+            if fmt_id is None:
+                fmt_id = max([FIRST_CUSTOM_FORMAT_ID - 1] + list(self.formats) + list(added_formats.values())) + 1
+                added_formats[fmt] = fmt_id
+            xf = xfs[style]
+            xf = re.sub(rb'\s(numFmtId|applyNumberFormat)="[^"]*"', b"", xf, count=2)
+            xf = b'<xf numFmtId="%d" applyNumberFormat="1"' % fmt_id + xf[3:]
+            added_xfs[(style, fmt)] = len(xfs)
+            xfs.append(xf)
+            return added_xfs[(style, fmt)]
+
+        def finish():
+            if not added_xfs:
+                return None
+            styles = data
+            if added_formats:
+                new_formats = b"".join(b'<numFmt numFmtId="%d" formatCode="%s"/>' % (fmt_id, escape(fmt).encode())
+                                       for fmt, fmt_id in added_formats.items())
+                count = len(self.formats) + len(added_formats)
+                match = re.search(rb'<numFmts\b[^>]*?(/>|>(.*?)</numFmts>)', styles, re.S)
+                if match:
+                    numfmts = b'<numFmts count="%d">%s%s</numFmts>' % (count, match.group(2) or b"", new_formats)
+                    styles = styles[:match.start()] + numfmts + styles[match.end():]
+                else:
+                    # numFmts 必须是 styleSheet 的第一个子元素
+                    opening = re.search(rb'<styleSheet\b[^>]*>', styles).end()
+                    styles = styles[:opening] + b'<numFmts count="%d">%s</numFmts>' % (count, new_formats) + styles[opening:]
+            match = re.search(rb'<cellXfs\b[^>]*>(.*?)</cellXfs>', styles, re.S)
+            new_xfs = b"".join(xfs[len(self.xf_formats):])
+            opening = re.sub(rb'count="\d+"', b'count="%d"' % len(xfs), styles[match.start():match.start(1)])
+            return styles[:match.start()] + opening + match.group(1) + new_xfs + b"</cellXfs>" + styles[match.end():]
+
+        return date_style, finish
+
+    @staticmethod
+    def _full_calc_on_load(data):
+        """让 Excel 打开时重新计算公式（与 openpyxl 保存时的设置相同），依赖被修改单元格的公式不会显示旧结果"""
+        match = re.search(rb'<calcPr\b[^>]*?/?>', data)
+        if match:
+            calc = re.sub(rb'\sfullCalcOnLoad="[^"]*"', b"", match.group(0))
+            calc = b'<calcPr fullCalcOnLoad="1"' + calc[len(b"<calcPr"):]
+            return data[:match.start()] + calc + data[match.end():]
+        for anchor in (b"</definedNames>", b"</sheets>"):
+            position = data.find(anchor)
+            if position >= 0:
+                position += len(anchor)
+                return data[:position] + FULL_CALC_ON_LOAD + data[position:]
+        raise UnsupportedWorkbook("无法识别 workbook.xml")
+
+    def save(self, updates, output_file=None):
+        """
+        把 updates {(行号, 列号): 值}（均从 1 开始）写入活动工作表，保存到 output_file（默认覆盖原文件）。
+        只有活动表、styles.xml（需要新增日期格式时）和 workbook.xml 的 calcPr 会被改写，其余成员按压缩后的字节原样复制。
+        先写临时文件再替换，出错时原文件保持不变。
+        """
+        output_file = output_file or self.path
+        rows = {}
+        for (row_idx, col), value in updates.items():
+            rows.setdefault(row_idx, {})[col] = value
+
+        with zipfile.ZipFile(self.path) as zin:
+            styles_data = zin.read(self.styles_part) if self.styles_part else None
+            date_style, finish_styles = self._styles_patcher(styles_data)
+            patched = {self.sheet_part: self._patch_sheet(zin.read(self.sheet_part), rows, date_style),
+                       self.workbook_part: self._full_calc_on_load(zin.read(self.workbook_part))}
+            new_styles = finish_styles()
+            if new_styles is not None:
+                patched[self.styles_part] = new_styles
+
+        directory = os.path.dirname(os.path.abspath(output_file))
+        fd, temp_file = tempfile.mkstemp(suffix=".xlsx", dir=directory)
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(self.path) as zin, zipfile.ZipFile(temp_file, "w") as zout:
+                for info in zin.infolist():
+                    if info.filename in patched:
+                        new_info = zipfile.ZipInfo(info.filename, info.date_time)
+                        new_info.compress_type = zipfile.ZIP_DEFLATED
+                        new_info.external_attr = info.external_attr
+                        zout.writestr(new_info, patched[info.filename])
+                    elif info.file_size >= zipfile.ZIP64_LIMIT or info.compress_size >= zipfile.ZIP64_LIMIT:
+                        raise UnsupportedWorkbook(f"{info.filename} 过大")
+                    else:
+                        _copy_raw(zin, zout, info)
+            # mkstemp 创建的文件权限为 0600，沿用被覆盖文件（或源文件）的权限；
+            # 原文件关闭后再替换，Windows 上不能替换仍处于打开状态的文件
+            shutil.copymode(output_file if os.path.exists(output_file) else self.path, temp_file)
+            os.replace(temp_file, output_file)
+        except BaseException:
+            os.remove(temp_file)
+            raise
@@ -1,9 +1,42 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, IntVar, Checkbutton
 from tkinter.ttk import Progressbar
+import os
+import time
 import pandas as pd
 from openpyxl import load_workbook
 from datetime import datetime, timedelta
+import excel_cache
+from xlsx_patch import SheetPatcher, UnsupportedWorkbook
+
+TARGET_KEY_COLUMN = 10  # 目标表中电能表编号（表资产号）所在的列，从 0 开始
+TARGET_TERMINAL_COLUMN = 9  # 目标表中终端编号（终端资产）所在的列，从 0 开始
+TARGET_FIRST_ROW = 4  # 目标表前三行为多级表头，数据从 Excel 第 4 行开始
+SOURCE_FIRST_ROW = 2  # 源表第一行为表头
+# 目标表 (子表头, 子子表头) -> 源表中对应的列
+SOURCE_FIELDS = {
+    ('时间', None): '数据时间',
+    ('正向有功', '总（kWh）'): '正向有功总',
+    ('正向有功', '尖（kWh）'): '正向有功尖',
+    ('正向有功', '峰（kWh）'): '正向有功峰',
+    ('正向有功', '平（kWh）'): '正向有功平',
+    ('正向有功', '谷（kWh）'): '正向有功谷',
+    ('正向无功', '总（kVarh）'): '正向无功总',
+}
+SOURCE_KEY = '表资产号'
+SOURCE_TERMINAL_KEY = '终端资产'  # 可选列，源表没有时只按表资产号匹配
+SOURCE_COLUMNS = [SOURCE_KEY] + list(SOURCE_FIELDS.values())  # 源表中必须有的列，其余列（除终端资产外）不使用
+# 源表编号列 -> 目标表中对应编号所在的列
+TARGET_KEY_COLUMNS = {SOURCE_KEY: TARGET_KEY_COLUMN, SOURCE_TERMINAL_KEY: TARGET_TERMINAL_COLUMN}
+# 匹配规则：依次尝试的编号列，前面的编号匹配到目标行就采用，不再看后面的编号
+MATCH_RULES = {
+    '仅按表资产号': (SOURCE_KEY,),
+    '表资产号优先，其次终端资产': (SOURCE_KEY, SOURCE_TERMINAL_KEY),
+    '终端资产优先，其次表资产号': (SOURCE_TERMINAL_KEY, SOURCE_KEY),
+}
+# 一个终端对应多块电能表，按终端资产匹配会把一块表的数据填到同一终端下的第一块表，需要时再手动选择
+DEFAULT_MATCH_RULE = '仅按表资产号'
+PROGRESS_INTERVAL = 0.2  # 进度最多每隔多少秒刷新一次
 
 # 设置试用期结束日期（精确到时分秒）
 # trial_end_datetime = datetime(2025, 3, 31, 20, 00, 00)  # 试用期结束时间
@@ -19,11 +52,53 @@ from datetime import datetime, timedelta
 #         minutes, seconds = divmod(remainder, 60)
 #         return f"{remaining_time.days}天 {hours}小时 {minutes}分钟 {seconds}秒"
 
-# 处理Excel数据的逻辑
-def process_excel(source_file, target_file, months, progress_var, progress_label):
-    source_data = pd.read_excel(source_file)
-    target_data = pd.read_excel(target_file, header=[0, 1, 2])  # 读取前三级作为多级表头
+def build_key_index(keys):
+    """
+    一次性建立 编号 -> 行位置（从 0 开始）的字典索引。空值不参与匹配；同一编号出现多次时与原来逐行查找一样取第一行，
+    所有重复的行返回在 duplicates {编号: [行位置, ...]} 中。
+    """
+    index = {}
+    duplicates = {}
+    for position, key in enumerate(keys):
+        if pd.isna(key):
+            continue
+        if key in index:
+            duplicates.setdefault(key, [index[key]]).append(position)
+        else:
+            index[key] = position
+    return index, duplicates
+
+
+def match_target_rows(source_data, key_indexes, rule):
+    """
+    按匹配规则为每个源数据行找目标行。key_indexes 为 {源表编号列: 目标表对应编号列的索引}，每个编号都是一次字典查找，
+    多个编号匹配的开销与只按一个编号匹配相同。
+    返回 (目标行位置列表（未匹配为 None）, 采用的编号列列表, 冲突列表 [(源行位置, {编号列: 目标行位置})])，
+    冲突指同一行的不同编号匹配到了目标表的不同行，此时按规则的先后顺序采用。
+    """
+    names = [name for name in rule if name in source_data.columns]
+    candidates = [[None if pd.isna(key) else key_indexes[name].get(key) for key in source_data[name]] for name in names]
+    positions, matched_by, conflicts = [], [], []
+    for row_position, row_candidates in enumerate(zip(*candidates)):
+        chosen = next(((name, position) for name, position in zip(names, row_candidates) if position is not None),
+                      (None, None))
+        matched_by.append(chosen[0])
+        positions.append(chosen[1])
+        if len({position for position in row_candidates if position is not None}) > 1:
+            conflicts.append((row_position, dict(zip(names, row_candidates))))
+    return positions, matched_by, conflicts
+
+
+def detect_month(times):
+    """从 数据时间 列识别源数据所属的月份（取出现次数最多的月份），返回如 '5月'，无法识别时返回 None"""
+    months = pd.to_datetime(times, errors='coerce').dropna().dt.month
+    if months.empty:
+        return None
+    return f"{months.mode().iloc[0]}月"
+
 
+def month_assignments(months):
+    """返回 [(目标列号, 源表列名), ...]，即这些月份需要从源表的哪一列填充到目标表的哪一列"""
     # 定义表头和月份
     sub_headers = ['时间', '正向有功', '正向无功']
     sub_sub_headers = ['总（kWh）', '尖（kWh）', '峰（kWh）', '平（kWh）', '谷（kWh）', '总（kVarh）']
@@ -47,59 +122,164 @@ def process_excel(source_file, target_file, months, progress_var, progress_label
                     col_idx = ((int(month.replace('月', '')) - 1) * 7 + 12) + len(sub_sub_headers) - 1
                     columns_mapping[(month, sub_header, sub_sub_header)] = col_idx
 
-    # 加载目标文件，准备更新数据
-    workbook = load_workbook(target_file)
+    # 按 (列号, 源表列名) 整理需要填充的单元格
+    return [(col_idx, SOURCE_FIELDS[(col[1], col[2] if len(col) > 2 else None)])
+            for col, col_idx in columns_mapping.items()]
+
+
+def write_match_report(report_file, unmatched, conflicts, target_duplicates, source_duplicates):
+    """把未匹配的源数据行、编号匹配冲突、目标表和源表中重复的编号分别写入报告的不同工作表"""
+    with pd.ExcelWriter(report_file) as writer:
+        pd.DataFrame(unmatched, columns=['源文件', '源表行号', SOURCE_KEY, SOURCE_TERMINAL_KEY]).to_excel(
+            writer, sheet_name='未匹配', index=False)
+        pd.DataFrame(conflicts, columns=['源文件', '源表行号', '采用的编号', '各编号匹配的目标表行号']).to_excel(
+            writer, sheet_name='匹配冲突', index=False)
+        pd.DataFrame([(name, key, ', '.join(map(str, rows))) for (name, key), rows in target_duplicates.items()],
+                     columns=['编号列', '编号', '目标表行号（只填充第一行）']).to_excel(writer, sheet_name='目标表重复',
+                                                                          index=False)
+        pd.DataFrame([(name, key, ', '.join(map(str, rows))) for (name, key), rows in source_duplicates.items()],
+                     columns=['源文件', '表资产号', '源表行号（后面的行覆盖前面的行）']).to_excel(writer, sheet_name='源表重复',
+                                                                                  index=False)
+
+
+def read_target_keys(target_file):
+    """
+    读取目标表活动工作表的各编号列，返回 ({源表编号列: 目标表对应列的值列表}, patcher, workbook)。
+    只扫描一遍读取编号列；工作簿结构不支持时退回 openpyxl 整体加载，此时 patcher 为 None。
+    """
+    names = list(TARGET_KEY_COLUMNS)
+    columns = [TARGET_KEY_COLUMNS[name] + 1 for name in names]
+    try:
+        patcher = SheetPatcher(target_file)
+        return dict(zip(names, patcher.read_columns(columns, TARGET_FIRST_ROW))), patcher, None
+    except UnsupportedWorkbook as e:
+        print(f"改用 openpyxl 读写目标文件: {e}")
+        workbook = load_workbook(target_file)
+        first_column = min(columns)
+        rows = list(workbook.active.iter_rows(min_row=TARGET_FIRST_ROW, min_col=first_column, max_col=max(columns),
+                                              values_only=True))
+        return {name: [row[column - first_column] for row in rows] for name, column in zip(names, columns)}, None, workbook
+
+
+def save_target(target_file, updates, patcher, workbook):
+    """只改写活动工作表中被修改的单元格，其余内容原样保留；遇到公式单元格等情况退回 openpyxl 整体保存"""
+    if patcher is not None:
+        try:
+            patcher.save(updates)
+            return
+        except UnsupportedWorkbook as e:
+            print(f"改用 openpyxl 保存目标文件: {e}")
+    workbook = workbook or load_workbook(target_file)
     sheet = workbook.active
+    for (target_row, col_idx), value in updates.items():
+        sheet.cell(row=target_row, column=col_idx).value = value
+    workbook.save(target_file)
 
-    # 遍历源数据，填充到目标表格
-    total_rows = len(source_data)
-    for index, row in source_data.iterrows():
-        progress_var.set(int((index / total_rows) * 100))
-        progress_label.config(text=f"正在处理: {index + 1}/{total_rows}")
-        root.update_idletasks()
-
-        # match_condition = (
-        #         (target_data.iloc[:, 9] == row['终端资产']) |  # 匹配终端编号
-        #         (target_data.iloc[:, 10] == row['表资产号'])  # 匹配电能表编号
-        # )
-        match_condition = (
-                (target_data.iloc[:, 10] == row['表资产号'])  # 匹配电能表编号
-        )
-        target_row_index = target_data.loc[match_condition].index
-
-        if not target_row_index.empty:
-            target_row_index = target_row_index + 4
-            for col, col_idx in columns_mapping.items():
-                header = col[0]
-                sub_header = col[1]
-                sub_sub_header = col[2] if len(col) > 2 else None
-
-                # 填充数据
-                if sub_header == '时间' and sub_sub_header is None:
-                    target_cell = sheet.cell(row=target_row_index[0], column=col_idx)
-                    target_cell.value = row['数据时间']
-                elif sub_header == '正向有功' and sub_sub_header == '总（kWh）':
-                    target_cell = sheet.cell(row=target_row_index[0], column=col_idx)
-                    target_cell.value = row['正向有功总']
-                elif sub_header == '正向有功' and sub_sub_header == '尖（kWh）':
-                    target_cell = sheet.cell(row=target_row_index[0], column=col_idx)
-                    target_cell.value = row['正向有功尖']
-                elif sub_header == '正向有功' and sub_sub_header == '峰（kWh）':
-                    target_cell = sheet.cell(row=target_row_index[0], column=col_idx)
-                    target_cell.value = row['正向有功峰']
-                elif sub_header == '正向有功' and sub_sub_header == '平（kWh）':
-                    target_cell = sheet.cell(row=target_row_index[0], column=col_idx)
-                    target_cell.value = row['正向有功平']
-                elif sub_header == '正向有功' and sub_sub_header == '谷（kWh）':
-                    target_cell = sheet.cell(row=target_row_index[0], column=col_idx)
-                    target_cell.value = row['正向有功谷']
-                elif sub_header == '正向无功' and sub_sub_header == '总（kVarh）':
-                    target_cell = sheet.cell(row=target_row_index[0], column=col_idx)
-                    target_cell.value = row['正向无功总']
 
-    workbook.save(target_file)
+# 处理Excel数据的逻辑
+def process_excel(source_files, target_file, months, progress_var, progress_label, match_rule=DEFAULT_MATCH_RULE):
+    """
+    把多个源文件的数据合并成一份更新计划，一次读取、一次保存目标文件。
+    months 为空时按每个源文件 数据时间 列识别月份；手动指定时所有源文件都填入这些月份，排在后面的文件覆盖前面的。
+    match_rule 为 MATCH_RULES 中的规则名，决定按哪些编号、以什么顺序匹配目标行。
+    """
+    rule = MATCH_RULES[match_rule]
+    last_refresh = 0.0
+
+    def show_progress(percent, text, force=False):
+        # 界面刷新限制在每秒几次，不再每处理一批行就刷新一次
+        nonlocal last_refresh
+        now = time.monotonic()
+        if force or now - last_refresh >= PROGRESS_INTERVAL:
+            last_refresh = now
+            progress_var.set(percent)
+            progress_label.config(text=text)
+            root.update_idletasks()
+
+    show_progress(0, f"正在读取目标文件: {target_file}", force=True)
+    target_keys, patcher, workbook = read_target_keys(target_file)
+    # 一次性为规则用到的每个编号列建立目标表索引，再把源数据的编号映射到目标行，代替逐行扫描整列
+    key_indexes, key_duplicates = {}, {}
+    for name in rule:
+        key_indexes[name], key_duplicates[name] = build_key_index(target_keys[name])
+
+    # 按源文件顺序、源数据顺序收集要写入的单元格 {(行号, 列号): 值}，同一单元格由后面的行覆盖
+    updates = {}
+    unmatched = []
+    conflicts = []
+    used_keys = set()  # 实际用来匹配过的 (编号列, 编号)
+    source_duplicates = {}
+    file_summaries = []
+    total_rows = 0
+    for file_no, source_file in enumerate(source_files):
+        name = os.path.basename(source_file)
+        show_progress(int(file_no / len(source_files) * 100), f"正在读取: {name}", force=True)
+        # 编号按原样读取，不因为有空值而被转换成浮点数
+        # 解析结果按文件内容缓存，同一份导出文件再次提交时不再解析；缓存的是整张表，用到的列在读出后再挑选
+        source_data = excel_cache.read_excel(source_file, dtype={name: object for name in TARGET_KEY_COLUMNS})
+        source_data = source_data[[column for column in source_data.columns
+                                   if column in SOURCE_COLUMNS or column in rule]]
+        missing = [column for column in SOURCE_COLUMNS if column not in source_data.columns]
+        if missing:
+            raise ValueError(f"{name} 缺少列: {'、'.join(missing)}")
+        file_months = months
+        if not file_months:
+            month = detect_month(source_data['数据时间'])
+            if month is None:
+                raise ValueError(f"无法从 {name} 的数据时间识别月份，请手动选择月份")
+            file_months = [month]
+        assignments = month_assignments(file_months)
+        value_columns = list(dict.fromkeys(column for _, column in assignments))
+
+        source_keys = source_data[SOURCE_KEY]
+        target_positions, matched_by, file_conflicts = match_target_rows(source_data, key_indexes, rule)
+        _, duplicates = build_key_index(source_keys)
+        source_duplicates.update(((name, key), [p + SOURCE_FIRST_ROW for p in rows]) for key, rows in duplicates.items())
+        terminal_keys = source_data.get(SOURCE_TERMINAL_KEY, pd.Series([None] * len(source_data)))
+        file_unmatched = [(name, position + SOURCE_FIRST_ROW, key, terminal_key)
+                          for position, (key, terminal_key, target_position)
+                          in enumerate(zip(source_keys, terminal_keys, target_positions))
+                          if target_position is None]
+        unmatched.extend(file_unmatched)
+        conflicts.extend((name, position + SOURCE_FIRST_ROW, matched_by[position],
+                          '；'.join(f"{key_name}: 第 {p + TARGET_FIRST_ROW} 行" for key_name, p in candidates.items()
+                                   if p is not None))
+                         for position, candidates in file_conflicts)
+        used_keys.update((key_name, source_data[key_name].iat[position])
+                         for position, key_name in enumerate(matched_by) if key_name is not None)
+
+        file_rows = len(source_data)
+        rows = source_data[value_columns].itertuples(index=False, name=None)
+        for position, (target_position, values) in enumerate(zip(target_positions, rows)):
+            show_progress(int((file_no + position / file_rows) / len(source_files) * 100),
+                          f"正在处理 {name}: {position + 1}/{file_rows}")
+            if target_position is None:
+                continue
+            row_values = dict(zip(value_columns, values))
+            target_row = target_position + TARGET_FIRST_ROW
+            for col_idx, column in assignments:
+                updates[(target_row, col_idx)] = row_values[column]
+        total_rows += file_rows
+        file_summaries.append(f"{name}（{'、'.join(file_months)}）: {file_rows} 行，未匹配 {len(file_unmatched)} 行")
+
+    show_progress(100, f"正在保存: {target_file}", force=True)
+    save_target(target_file, updates, patcher, workbook)
     print(f"数据已成功填充并保存到 {target_file}")
-    messagebox.showinfo("完成", "数据处理完成并已保存到目标文件！")
+
+    # 表资产号在目标表中的重复全部报告；其他编号（如一个终端对应多块表）只报告实际用来匹配过的
+    target_duplicates = {(key_name, key): [p + TARGET_FIRST_ROW for p in rows]
+                         for key_name, duplicates in key_duplicates.items() for key, rows in duplicates.items()
+                         if key_name == SOURCE_KEY or (key_name, key) in used_keys}
+
+    summary = "\n".join(file_summaries)
+    summary += f"\n共 {total_rows} 行源数据，匹配 {total_rows - len(unmatched)} 行，未匹配 {len(unmatched)} 行。"
+    if unmatched or conflicts or target_duplicates or source_duplicates:
+        report_file = os.path.splitext(target_file)[0] + "_匹配报告.xlsx"
+        write_match_report(report_file, unmatched, conflicts, target_duplicates, source_duplicates)
+        summary += (f"\n编号匹配冲突 {len(conflicts)} 行，目标表重复编号 {len(target_duplicates)} 个，"
+                    f"源表重复编号 {len(source_duplicates)} 个。\n明细见: {report_file}")
+    progress_label.config(text="处理完成")
+    messagebox.showinfo("完成", f"数据处理完成并已保存到目标文件！\n{summary}")
 
 
 # 修改选择文件的功能，自动选择文件
@@ -113,24 +293,35 @@ def select_file(file_label):
         return None
 
 
+def select_source_files():
+    """源文件可以一次选择多个（例如各月的导出文件）"""
+    file_paths = filedialog.askopenfilenames(filetypes=[("Excel Files", "*.xls *.xlsx")])
+    source_files[:] = file_paths
+    if file_paths:
+        names = "、".join(os.path.basename(path) for path in file_paths)
+        file_label.config(text=f"已选择 {len(file_paths)} 个源文件: {names}", wraplength=560)
+    else:
+        file_label.config(text="未选择文件")
+
+
+def clear_excel_cache():
+    count, freed = excel_cache.clear_cache()
+    messagebox.showinfo("清除缓存", f"已删除 {count} 个缓存文件，释放 {freed / 1024 / 1024:.1f} MB")
+
+
 def start_processing():
     # 获取选择的文件
-    source_file = file_label.cget("text").replace("已选择文件: ", "")
     target_file = target_file_label.cget("text").replace("已选择文件: ", "")
 
-    # 获取选择的月份
+    # 获取选择的月份；不选时按各源文件的数据时间自动识别
     months = [month for month, var in month_vars.items() if var.get() == 1]
 
-    if not months:
-        messagebox.showwarning("警告", "请选择至少一个月份！")
-        return
-
-    if not source_file or not target_file:
+    if not source_files or not target_file.endswith(('.xls', '.xlsx')):
         messagebox.showwarning("警告", "请选择源文件和目标文件！")
         return
 
     try:
-        process_excel(source_file, target_file, months, progress_var, progress_label)
+        process_excel(source_files, target_file, months, progress_var, progress_label, match_rule_var.get())
     except Exception as e:
         messagebox.showerror("错误", f"处理文件时出错: {e}")
 
@@ -138,13 +329,14 @@ def start_processing():
 # 创建 GUI 界面
 root = tk.Tk()
 root.title("油田电子表数据_Excel文件处理工具_V1.0")
-root.geometry("600x450")
+root.geometry("600x580")
 
 # 文件选择部分
-file_label = tk.Label(root, text="点击下方按钮选择 Excel 文件", font=("Arial", 12))
+file_label = tk.Label(root, text="点击下方按钮选择源 Excel 文件", font=("Arial", 12))
 file_label.pack(pady=10)
 
-select_button = tk.Button(root, text="选择源文件", command=lambda: select_file(file_label))
+source_files = []
+select_button = tk.Button(root, text="选择源文件（可多选）", command=select_source_files)
 select_button.pack(pady=10)
 
 target_file_label = tk.Label(root, text="点击下方按钮选择目标 Excel 文件", font=("Arial", 12))
@@ -161,13 +353,22 @@ month_vars = {}
 month_frame = tk.Frame(root)
 month_frame.pack(pady=10)
 
+tk.Label(month_frame, text="填充月份（不选则按源文件的数据时间自动识别）").grid(row=0, column=0, columnspan=6)
+
 # 使用 grid 布局将月份分为两行显示
 for i, month in enumerate(month_labels):
     month_vars[month] = IntVar()
-    row = i // 6  # 计算行数，将月份分为两行
+    row = i // 6 + 1  # 计算行数，将月份分为两行（第 0 行是说明）
     col = i % 6  # 计算列数
     Checkbutton(month_frame, text=month, variable=month_vars[month]).grid(row=row, column=col, pady=2)
 
+# 匹配规则
+match_frame = tk.Frame(root)
+match_frame.pack(pady=5)
+tk.Label(match_frame, text="匹配规则:").pack(side=tk.LEFT)
+match_rule_var = tk.StringVar(value=DEFAULT_MATCH_RULE)
+tk.OptionMenu(match_frame, match_rule_var, *MATCH_RULES).pack(side=tk.LEFT)
+
 # 进度条
 progress_var = tk.IntVar()
 progress_bar = Progressbar(root, orient="horizontal", length=400, mode="determinate", variable=progress_var)
@@ -193,4 +394,7 @@ progress_label.pack(pady=5)
 process_button = tk.Button(root, text="开始处理", command=start_processing)
 process_button.pack(pady=10)
 
+clear_cache_button = tk.Button(root, text="清除源文件解析缓存", command=clear_excel_cache)
+clear_cache_button.pack(pady=5)
+
 root.mainloop()
@@ -14,6 +14,7 @@ import math
 import win32com.client
 import pythoncom
 import functools
+from fast_walk import walk
 
 Image.MAX_IMAGE_PIXELS = 1000000000  # 设置为10亿像素，适应大图
 
@@ -257,7 +258,7 @@ def process_images_in_folder(root_folder):
 
     write_log(f"📏 扫描根目录: {root_folder} 开始 ")
 
-    for current_folder, subfolders, filenames in os.walk(root_folder):
+    for current_folder, subfolders, filenames in walk(root_folder):
         if stop_processing:
             write_log("🚫 停止信号收到，提前终止扫描")
             return
@@ -12,6 +12,7 @@ from tkinter import filedialog, scrolledtext
 from PIL import Image, ImageCms, ImageDraw
 import math
 import win32com.client
+from fast_walk import walk
 Image.MAX_IMAGE_PIXELS = 1000000000  # 设置为5亿像素，适应你的大图
 
 # 全局变量
@@ -97,7 +98,7 @@ def process_images_in_folder(root_folder):
     ps_app.DisplayDialogs = 2  # 全局静默模式
     success_count = 0
 
-    for current_folder, subfolders, filenames in os.walk(root_folder):
+    for current_folder, subfolders, filenames in walk(root_folder):
         if stop_processing:
             write_log("🚫 停止信号收到，提前终止扫描")
             return
@@ -1,9 +1,16 @@
-import os
-import shutil
+import queue
 import threading
 import tkinter as tk
 from tkinter import filedialog, ttk, scrolledtext, messagebox
 import datetime
+from file_search_engine import (FileSearchEngine, PersistentFileIndex, parse_keyword_lines,
+                                DEFAULT_COPY_WORKERS)
+
+INDEX_STALE_HOURS = 24  # 超过该时长未刷新的索引在界面上标记为过期
+# 界面上的副本方式名称 -> 引擎参数
+DUPLICATE_MODE_LABELS = {"完整复制": "copy", "硬链接": "hardlink", "克隆(reflink)": "reflink"}
+COPY_METHOD_NAMES = {"copy": "复制", "hardlink": "硬链接", "reflink": "克隆"}
+
 
 class FileSearchTool:
     def __init__(self, root):
@@ -11,7 +18,8 @@ class FileSearchTool:
         self.root.title("文件搜索小工具V1.1")
         self.root.geometry("700x600")
 
-        self.stop_flag = False
+        self.engine = None
+        self.events = queue.Queue()  # 后台线程产生的事件，由界面线程定时取出处理
 
         # 文件名输入区域
         tk.Label(root, text="请输入文件名 & 数量（每行一个）:").pack(anchor="w", padx=10, pady=5)
@@ -24,8 +32,16 @@ class FileSearchTool:
         tk.Label(frame1, text="搜索目录:").pack(side="left")
         self.search_entry = tk.Entry(frame1)
         self.search_entry.pack(side="left", fill="x", expand=True, padx=5)
+        self.search_entry.bind("<FocusOut>", lambda e: self.update_index_status())
         tk.Button(frame1, text="选择目录", command=self.choose_search_dir).pack(side="right")
 
+        # 索引状态
+        frame_index = tk.Frame(root)
+        frame_index.pack(fill="x", padx=10)
+        self.index_status_label = tk.Label(frame_index, text="索引状态: 未选择搜索目录", fg="gray")
+        self.index_status_label.pack(side="left")
+        tk.Button(frame_index, text="重建索引", command=self.start_rebuild_index).pack(side="right")
+
         # 保存目录
         frame2 = tk.Frame(root)
         frame2.pack(fill="x", padx=10, pady=5)
@@ -34,6 +50,18 @@ class FileSearchTool:
         self.save_entry.pack(side="left", fill="x", expand=True, padx=5)
         tk.Button(frame2, text="选择目录", command=self.choose_save_dir).pack(side="right")
 
+        # 复制选项
+        frame_copy = tk.Frame(root)
+        frame_copy.pack(fill="x", padx=10, pady=5)
+        tk.Label(frame_copy, text="多份副本方式:").pack(side="left")
+        self.duplicate_mode = ttk.Combobox(frame_copy, values=list(DUPLICATE_MODE_LABELS), state="readonly", width=14)
+        self.duplicate_mode.current(0)
+        self.duplicate_mode.pack(side="left", padx=5)
+        tk.Label(frame_copy, text="复制线程数:").pack(side="left", padx=(15, 0))
+        self.workers_entry = tk.Entry(frame_copy, width=5)
+        self.workers_entry.insert(0, str(DEFAULT_COPY_WORKERS))
+        self.workers_entry.pack(side="left", padx=5)
+
         # 按钮
         frame3 = tk.Frame(root)
         frame3.pack(fill="x", padx=10, pady=10)
@@ -50,11 +78,14 @@ class FileSearchTool:
         self.progress = ttk.Progressbar(root, orient="horizontal", length=600, mode="determinate")
         self.progress.pack(padx=10, pady=5)
 
+        self.root.after(100, self.poll_events)
+
     def choose_search_dir(self):
         path = filedialog.askdirectory()
         if path:
             self.search_entry.delete(0, tk.END)
             self.search_entry.insert(0, path)
+            self.update_index_status()
 
     def choose_save_dir(self):
         path = filedialog.askdirectory()
@@ -62,27 +93,98 @@ class FileSearchTool:
             self.save_entry.delete(0, tk.END)
             self.save_entry.insert(0, path)
 
+    def update_index_status(self):
+        search_dir = self.search_entry.get().strip()
+        if not search_dir:
+            self.index_status_label.config(text="索引状态: 未选择搜索目录", fg="gray")
+            return
+        status = PersistentFileIndex.status(search_dir)
+        if status is None:
+            self.index_status_label.config(text="索引状态: 尚未建立（首次搜索时自动建立）", fg="red")
+            return
+        file_count, refreshed_at = status
+        age_hours = (datetime.datetime.now() - refreshed_at).total_seconds() / 3600
+        stale = age_hours > INDEX_STALE_HOURS
+        self.index_status_label.config(
+            text=f"索引状态: {file_count} 个文件，更新于 {refreshed_at:%Y-%m-%d %H:%M}"
+                 f"（{age_hours:.1f} 小时前{'，已过期' if stale else ''}）",
+            fg="red" if stale else "green")
+
+    def start_rebuild_index(self):
+        search_dir = self.search_entry.get().strip()
+        if not search_dir:
+            messagebox.showwarning("警告", "请先选择搜索目录！")
+            return
+        self.engine = FileSearchEngine(search_dir, "", on_event=self.events.put)
+        threading.Thread(target=self.rebuild_index, args=(self.engine,)).start()
+
+    def rebuild_index(self, engine):
+        index = engine.open_index(rebuild=True)
+        if index is None:
+            self.events.put({"event": "log", "message": "重建索引已中断！"})
+            return
+        if isinstance(index, PersistentFileIndex):
+            # 持久索引不可用时 open_index 退回到内存索引，内存索引无需关闭
+            index.close()
+        self.events.put({"event": "index_rebuilt"})
+
     def log(self, msg):
         self.log_text.insert(tk.END, msg + "\n")
         self.log_text.see(tk.END)
-        self.root.update()
+
+    def poll_events(self):
+        """在界面线程中处理后台事件，后台线程不直接操作任何控件"""
+        try:
+            while True:
+                self.handle_event(self.events.get_nowait())
+        except queue.Empty:
+            pass
+        self.root.after(100, self.poll_events)
+
+    def handle_event(self, ev):
+        kind = ev["event"]
+        if kind == "log":
+            self.log(ev["message"])
+        elif kind == "index_start":
+            action = "重建" if ev["rebuild"] else ("刷新" if ev["persistent"] else "建立")
+            self.log(f"正在{action}文件索引: {ev['search_dir']}")
+        elif kind == "index_fallback":
+            self.log(f"持久索引不可用（{ev['error']}），改为临时扫描目录")
+        elif kind == "index_ready":
+            if "listed_dirs" in ev:
+                self.log(f"索引刷新完成，重新列出 {ev['listed_dirs']}/{ev['total_dirs']} 个目录，共 {ev['files']} 个文件")
+            else:
+                self.log(f"索引建立完成，共 {ev['files']} 个文件")
+        elif kind == "index_rebuilt":
+            self.update_index_status()
+        elif kind == "match":
+            if ev["matches"]:
+                self.log(f"[{ev['line']}/{ev['total']}] ✅ 找到 {ev['matches']} 个匹配: {ev['keyword']} "
+                         f"(每个复制 {ev['count']} 份)")
+            else:
+                self.log(f"[{ev['line']}/{ev['total']}] ❌ 未找到: {ev['keyword']}")
+        elif kind == "copy":
+            self.log(f"   → {COPY_METHOD_NAMES[ev['method']]}: {ev['src']} -> {ev['dst']}")
+        elif kind == "copy_error":
+            self.log(f"   ❌ 复制失败: {ev['src']}，错误: {ev['error']}")
+        elif kind == "progress":
+            self.progress["value"] = ev["done"]
+        elif kind in ("done", "stopped"):
+            if kind == "stopped":
+                self.log("搜索已中断！")
+            self.log(f"共复制 {ev['files_copied']} 个文件（{ev['bytes_copied'] / 1024 / 1024:.1f} MB），"
+                     f"链接 {ev['links']} 个，用时 {ev['elapsed']:.1f} 秒（{ev['mb_per_sec']} MB/s）")
+            self.update_index_status()
+            self.log("任务完成！")
 
     def stop_search(self):
-        self.stop_flag = True
+        if self.engine is not None:
+            self.engine.stop()
         self.log("停止任务...")
 
-
     def start_search(self):
         # 解析输入，每行格式：文件名 数量
-        raw_lines = self.filename_text.get("1.0", tk.END).strip().splitlines()
-        filenames = []
-        for line in raw_lines:
-            parts = line.strip().split()
-            if not parts:
-                continue
-            fname = parts[0]
-            count = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 1
-            filenames.append((fname, count))
+        filenames = parse_keyword_lines(self.filename_text.get("1.0", tk.END).strip().splitlines())
 
         search_dir = self.search_entry.get().strip()
         save_dir = self.save_entry.get().strip()
@@ -91,53 +193,19 @@ class FileSearchTool:
             messagebox.showwarning("警告", "请输入文件名并选择目录！")
             return
 
-        self.stop_flag = False
+        try:
+            workers = max(1, int(self.workers_entry.get().strip()))
+        except ValueError:
+            workers = DEFAULT_COPY_WORKERS
+        mode = DUPLICATE_MODE_LABELS[self.duplicate_mode.get()]
+
         self.progress["value"] = 0
         self.progress["maximum"] = len(filenames)
 
-        t = threading.Thread(target=self.search_files, args=(filenames, search_dir, save_dir))
+        self.engine = FileSearchEngine(search_dir, save_dir, workers=workers, mode=mode, on_event=self.events.put)
+        t = threading.Thread(target=self.engine.run, args=(filenames,))
         t.start()
 
-    def search_files(self, filenames, search_dir, save_dir):
-        global_index = 1  # 全局序号前缀（每一行关键字一个序号）
-
-        for i, (fname, count) in enumerate(filenames, start=1):
-            if self.stop_flag:
-                self.log("搜索已中断！")
-                break
-
-            # 收集所有匹配到的文件（前缀匹配）
-            matches = []
-            for root, dirs, files in os.walk(search_dir):
-                for file in files:
-                    if file.startswith(fname):  # 依然使用前缀匹配
-                        matches.append(os.path.join(root, file))
-
-            if not matches:
-                self.log(f"[{i}/{len(filenames)}] ❌ 未找到: {fname}")
-                self.progress["value"] = i
-                self.root.update()
-                continue
-
-            # 日志：找到多少个候选文件
-            self.log(f"[{i}/{len(filenames)}] ✅ 找到 {len(matches)} 个匹配: {fname} (每个复制 {count} 份)")
-
-            # 对同一关键字下的所有匹配文件，逐个复制；该关键字的全局前缀保持一致
-            for src in sorted(matches):
-                name, ext = os.path.splitext(os.path.basename(src))
-                for c in range(1, count + 1):
-                    new_name = f"{global_index}_{name}_{c}{ext}"
-                    dst = os.path.join(save_dir, new_name)
-                    shutil.copy2(src, dst)
-                    self.log(f"   → 复制: {src} -> {dst}")
-
-            # 这一行（一个关键字）处理完后，再递增全局前缀
-            global_index += 1
-
-            self.progress["value"] = i
-            self.root.update()
-
-        self.log("任务完成！")
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -1,29 +1,36 @@
 import os
 import tkinter as tk
 from tkinter import filedialog, messagebox, StringVar, OptionMenu, IntVar, Checkbutton
+import numpy as np
 import pandas as pd
 from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter
 from tkinter.ttk import Progressbar, Style
 from datetime import datetime
+import excel_cache
+
+DEDUP_KEYS = ["CGI（必填，CGI序列或运营商名称）", "LAC（必填）", "CI（必填）"]
+
 
 # 去重处理（按 LAC 和 CI 去重）
 def deduplicate(df):
-    """按 LAC 和 CI 去重，优先保留经纬度不为 0 的数据"""
-    deduplicated = []
-    grouped = df.groupby(["CGI（必填，CGI序列或运营商名称）", "LAC（必填）", "CI（必填）"])
-
-    for _, group in grouped:
-        # 检查是否存在经纬度不为 0 的行
-        valid_rows = group[(group["基站经度"] != 0) & (group["基站纬度"] != 0)]
-        if not valid_rows.empty:
-            # 如果存在经纬度不为 0 的数据，优先保留第一条
-            deduplicated.append(valid_rows.iloc[0])
-        else:
-            # 如果所有行的经纬度均为 0，随机保留一条
-            deduplicated.append(group.iloc[0])
-
-    return pd.DataFrame(deduplicated)
+    """
+    按 CGI、LAC 和 CI 去重，优先保留经纬度不为 0 的数据：每组取第一条经纬度都不为 0 的行，没有时取第一条。
+    结果与逐组处理完全相同：键含空值的行不参与分组，结果按分组键排序，保留原行索引。
+    """
+    # 分组编号沿用 groupby 的规则（排序、丢弃空值键），空值键的编号为 -1 或 NaN（视 pandas 版本而定）
+    group_ids = df.groupby(DEDUP_KEYS).ngroup().to_numpy(dtype=float)
+    has_coordinates = ((df["基站经度"] != 0) & (df["基站纬度"] != 0)).to_numpy()
+    positions = np.flatnonzero(group_ids >= 0)
+    # 稳定排序：先按分组，组内经纬度有效的行排在前面，其余保持原有顺序，每组第一行即为保留的行
+    order = positions[np.lexsort((~has_coordinates[positions], group_ids[positions]))]
+    sorted_ids = group_ids[order]
+    first_in_group = np.r_[True, sorted_ids[1:] != sorted_ids[:-1]] if len(order) else np.array([], dtype=bool)
+    selected = df.iloc[order[first_in_group]]
+    if selected.empty:
+        return pd.DataFrame()
+    # 原来由逐行的 Series 拼成 DataFrame，各列按单元格的值重新推断类型；这里按行列表构造，推断规则相同
+    return pd.DataFrame(selected.to_numpy(dtype=object).tolist(), index=selected.index, columns=selected.columns)
 
 
 # CGI 对应关系字典
@@ -52,10 +59,12 @@ def process_excel(input_file, output_file, progress_var, progress_label, output_
     file_extension = os.path.splitext(input_file)[1].lower()
     engine = "openpyxl" if file_extension == ".xlsx" else "xlrd"
 
-    # 读取表格1中的所有 sheet 页
-    sheets = pd.ExcelFile(input_file, engine=engine)
-    total_sheets = len(sheets.sheet_names)
-    for idx, sheet_name in enumerate(sheets.sheet_names, start=1):
+    # 一次读取表格1中的所有 sheet 页；解析结果按文件内容缓存，同一文件再次处理时不再解析
+    progress_label.config(text="正在读取文件...")
+    root.update_idletasks()
+    sheets = excel_cache.read_excel(input_file, sheet_name=None, engine=engine)
+    total_sheets = len(sheets)
+    for idx, (sheet_name, sheet_df) in enumerate(sheets.items(), start=1):
         if sheet_name == 'WIFI':
             continue
         # 更新进度条
@@ -63,9 +72,6 @@ def process_excel(input_file, output_file, progress_var, progress_label, output_
         progress_label.config(text=f"正在处理: {sheet_name} ({idx}/{total_sheets})")
         root.update_idletasks()
 
-        # 读取每个 sheet 页
-        sheet_df = pd.read_excel(input_file, sheet_name=sheet_name, engine=engine)
-
         # CGI 值来源于映射关系
         cgi_value = CGI_MAPPING.get(sheet_name, '')
         if cgi_value != '':
@@ -158,10 +164,8 @@ def process_excel_format2(input_file, output_file, progress_var, progress_label,
     # 使用 pandas 读取 Excel 文件，指定前两行作为表头
     # df = pd.read_excel(input_file, header=[0, 1], engine=engine)  # 如果是 .xlsx 文件
 
-    # 使用 pd.ExcelFile 读取文件
-    xls = pd.ExcelFile(input_file, engine=engine)
-    # 假设我们要读取文件中的第一个工作表，使用 header=[0, 1] 合并前两行表头
-    df = xls.parse(sheet_name=0, header=[0, 1])
+    # 读取文件中的第一个工作表，使用 header=[0, 1] 合并前两行表头；解析结果按文件内容缓存
+    df = excel_cache.read_excel(input_file, sheet_name=0, header=[0, 1], engine=engine)
 
     # 扁平化多级表头为单级表头，组合第一行和第二行
     df.columns = ['_'.join(col).strip() for col in df.columns.values]
@@ -279,6 +283,11 @@ def select_file():
         process_button.config(state=tk.DISABLED)
 
 
+def clear_excel_cache():
+    count, freed = excel_cache.clear_cache()
+    messagebox.showinfo("清除缓存", f"已删除 {count} 个缓存文件，释放 {freed / 1024 / 1024:.1f} MB")
+
+
 def start_processing():
     input_file = file_label.cget("text").replace("已选择文件: ", "")
     if not input_file or not os.path.isfile(input_file):
@@ -315,55 +324,59 @@ def start_processing():
         messagebox.showwarning("警告", "未选择文件格式！")
 
 
-# 创建 GUI 界面
-root = tk.Tk()
-root.title("Excel文件处理工具")
-root.geometry("600x400")
-root.resizable(False, False)
+if __name__ == "__main__":
+    # 创建 GUI 界面
+    root = tk.Tk()
+    root.title("Excel文件处理工具")
+    root.geometry("600x480")
+    root.resizable(False, False)
+
+    # 样式设置
+    style = Style()
+    style.configure("TProgressbar", thickness=15)
 
-# 样式设置
-style = Style()
-style.configure("TProgressbar", thickness=15)
+    # 文件选择部分
+    file_label = tk.Label(root, text="点击下方按钮选择Excel文件", font=("Arial", 12))
+    file_label.pack(pady=10)
 
-# 文件选择部分
-file_label = tk.Label(root, text="点击下方按钮选择Excel文件", font=("Arial", 12))
-file_label.pack(pady=10)
+    select_button = tk.Button(root, text="选择文件", command=select_file)
+    select_button.pack(pady=10)
 
-select_button = tk.Button(root, text="选择文件", command=select_file)
-select_button.pack(pady=10)
+    # 文件选择部分
+    file_label = tk.Label(root, text="请选择Excel文件数据格式", font=("Arial", 12))
+    file_label.pack(pady=10)
 
-# 文件选择部分
-file_label = tk.Label(root, text="请选择Excel文件数据格式", font=("Arial", 12))
-file_label.pack(pady=10)
+    # 创建复选框用于选择格式
+    format1_var = IntVar(root)
+    format2_var = IntVar(root)
+    # 格式选择复选框
+    format1_checkbox = Checkbutton(root, text="格式1(多页)", variable=format1_var)
+    format2_checkbox = Checkbutton(root, text="格式2(多级表头)", variable=format2_var)
+    format1_checkbox.pack(pady=5)
+    format2_checkbox.pack(pady=5)
 
-# 创建复选框用于选择格式
-format1_var = IntVar(root)
-format2_var = IntVar(root)
-# 格式选择复选框
-format1_checkbox = Checkbutton(root, text="格式1(多页)", variable=format1_var)
-format2_checkbox = Checkbutton(root, text="格式2(多级表头)", variable=format2_var)
-format1_checkbox.pack(pady=5)
-format2_checkbox.pack(pady=5)
+    # 进度条
+    progress_var = tk.IntVar()
+    progress_bar = Progressbar(root, orient="horizontal", length=400, mode="determinate", variable=progress_var)
+    progress_bar.pack(pady=10)
 
-# 进度条
-progress_var = tk.IntVar()
-progress_bar = Progressbar(root, orient="horizontal", length=400, mode="determinate", variable=progress_var)
-progress_bar.pack(pady=10)
+    progress_label = tk.Label(root, text="", font=("Arial", 10), fg="green")
+    progress_label.pack(pady=5)
 
-progress_label = tk.Label(root, text="", font=("Arial", 10), fg="green")
-progress_label.pack(pady=5)
+    # 输出文件路径显示
+    output_label = tk.Label(root, text="", font=("Arial", 10), fg="blue", wraplength=500, justify="center")
+    output_label.pack(pady=10)
 
-# 输出文件路径显示
-output_label = tk.Label(root, text="", font=("Arial", 10), fg="blue", wraplength=500, justify="center")
-output_label.pack(pady=10)
+    # 处理按钮
+    process_button = tk.Button(root, text="开始处理", state=tk.DISABLED, command=start_processing)
+    process_button.pack(pady=10)
 
-# 处理按钮
-process_button = tk.Button(root, text="开始处理", state=tk.DISABLED, command=start_processing)
-process_button.pack(pady=10)
+    clear_cache_button = tk.Button(root, text="清除解析缓存", command=clear_excel_cache)
+    clear_cache_button.pack(pady=5)
 
-# 剩余试用期显示
-trial_label = tk.Label(root, text="", font=("Arial", 10), fg="red")
-trial_label.pack(pady=10)
+    # 剩余试用期显示
+    trial_label = tk.Label(root, text="", font=("Arial", 10), fg="red")
+    trial_label.pack(pady=10)
 
-# 主循环
-root.mainloop()
+    # 主循环
+    root.mainloop()